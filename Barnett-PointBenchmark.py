@@ -0,0 +1,333 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# PointBenchmark.py
+
+'''Benchmark for PointConverter.py.
+
+Generates synthetic Houdini point clouds, ascii (.pc.classic) or binary
+(.bgeo), from 10K up to 50M points with or without ids, and times the
+converter on them. Single frames are timed through convertPcToPdc, the
+call each worker makes, with its per stage metrics, and sequences are
+timed end to end through threadme.
+Every measurement runs in a freshly started interpreter, not a fork of
+this one, so the peak resident memory it reports belongs to that
+measurement alone.
+
+Results are written one JSON object per line so runs from different
+versions of the converter can be compared.
+
+Usage:
+    Barnett-PointBenchmark.py --sizes 10000,1000000 --frames 8 -o results.jsonl
+    Barnett-PointBenchmark.py --full
+'''
+
+
+from argparse import ArgumentParser
+from datetime import datetime
+from imp import load_source
+from json import dump
+from json import dumps
+from json import load
+from json import loads
+from multiprocessing import freeze_support
+from os import close
+from os import devnull
+from os import path
+from os import remove
+from shutil import rmtree
+from subprocess import check_call
+from struct import pack
+from sys import argv as sysargv
+from sys import exit as sysexit
+from sys import platform
+from sys import version as pythonVersion
+from tempfile import mkdtemp
+from tempfile import mkstemp
+from time import time
+from warnings import simplefilter
+from StringIO import StringIO
+from numpy import arange
+from numpy import savetxt
+from numpy.random import RandomState
+import sys
+
+try:
+    from resource import getrusage
+    from resource import RUSAGE_CHILDREN
+    from resource import RUSAGE_SELF
+except ImportError:
+    getrusage = None
+try:
+    from psutil import Process as PsutilProcess
+except ImportError:
+    PsutilProcess = None
+
+converterFile = path.join(path.dirname(path.abspath(__file__)), 'Barnett-PointConverter.py')
+converter = load_source('PointConverter', converterFile)
+
+defaultSizes = [10000, 100000, 1000000]
+fullSizes = [10000, 100000, 1000000, 10000000, 50000000]
+chunkPoints = 1000000
+
+
+def processPeak():
+    """Returns this interpreter's own peak resident memory in bytes where the system reports it
+
+    getrusage's figure is carried across exec on Linux, so a freshly
+    started measurement would report its parent's peak. VmHWM is not.
+    """
+    try:
+        with open('/proc/self/status', 'r') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def peakRss():
+    """Returns the peak resident memory of this process and its children in bytes"""
+    if getrusage is not None:
+        scale = 1 if platform == 'darwin' else 1024
+        own = processPeak()
+        if own is None:
+            own = getrusage(RUSAGE_SELF).ru_maxrss * scale
+        return max(own, getrusage(RUSAGE_CHILDREN).ru_maxrss * scale)
+    if PsutilProcess is not None:
+        memory = PsutilProcess().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss)
+    return None
+
+
+def jsonLength(length):
+    """Encodes a length the way Houdini's binary JSON does"""
+    if length < 0xf1:
+        return chr(length)
+    if length <= 0xffff:
+        return '\xf2' + pack('<H', length)
+    if length <= 0xffffffff:
+        return '\xf4' + pack('<I', length)
+    return '\xf8' + pack('<Q', length)
+
+
+def jsonString(text):
+    return '\x27' + jsonLength(len(text)) + text
+
+
+def jsonInt(value):
+    return '\x13' + pack('<i', value)
+
+
+def writeAsciiCloud(fileName, points, ids, seed):
+    """Writes a synthetic ascii Houdini point cloud a chunk of points at a time"""
+    random = RandomState(seed)
+    outputFile = open(fileName, 'w')
+    try:
+        outputFile.write('[\n\t"fileversion","12.0.0",\n\t"pointcount",%d,\n'
+                         '\t"vertexcount",0,\n\t"primitivecount",0,\n'
+                         '\t"attributes",[\n\t\t"pointattributes",[\n' % points)
+        outputFile.write('\t\t\t[\n\t\t\t\t["scope","public","type","numeric","name","P"],\n'
+                         '\t\t\t\t["size",3,"storage","fpreal32","values",\n'
+                         '\t\t\t\t\t["size",3,"storage","fpreal32","tuples",[')
+        for start in range(0, points, chunkPoints):
+            count = min(chunkPoints, points - start)
+            text = StringIO()
+            savetxt(text, random.uniform(-10, 10, (count, 3)), fmt='[%.6f,%.6f,%.6f]',
+                    newline=',')
+            outputFile.write(text.getvalue()[:-1] if start + count == points
+                             else text.getvalue())
+        outputFile.write(']]\n\t\t\t\t]\n\t\t\t]')
+        if ids:
+            outputFile.write(',\n\t\t\t[\n\t\t\t\t["scope","public","type","numeric","name","id"],\n'
+                             '\t\t\t\t["size",1,"storage","int32","values",\n'
+                             '\t\t\t\t\t["size",1,"storage","int32","arrays",[[')
+            for start in range(0, points, chunkPoints):
+                count = min(chunkPoints, points - start)
+                text = StringIO()
+                savetxt(text, arange(start, start + count), fmt='%d', newline=',')
+                outputFile.write(text.getvalue()[:-1] if start + count == points
+                                 else text.getvalue())
+            outputFile.write(']]]\n\t\t\t\t]\n\t\t\t]')
+        outputFile.write('\n\t\t]\n\t],\n\t"primitives",[\n\t]\n]\n')
+    finally:
+        outputFile.close()
+
+
+def writeBinaryCloud(fileName, points, ids, seed):
+    """Writes a synthetic binary Houdini point cloud a chunk of points at a time"""
+    random = RandomState(seed)
+    outputFile = open(fileName, 'wb')
+    try:
+        outputFile.write('\x7fNSJb[' + jsonString('fileversion') + jsonString('13.0.0') +
+                         jsonString('pointcount') + jsonInt(points) +
+                         jsonString('vertexcount') + jsonInt(0) +
+                         jsonString('primitivecount') + jsonInt(0) +
+                         jsonString('attributes') + '[' + jsonString('pointattributes') + '[')
+        outputFile.write('[[' + jsonString('scope') + jsonString('public') +
+                         jsonString('type') + jsonString('numeric') +
+                         jsonString('name') + jsonString('P') + '][' +
+                         jsonString('size') + jsonInt(3) +
+                         jsonString('storage') + jsonString('fpreal32') +
+                         jsonString('values') + '[' + jsonString('size') + jsonInt(3) +
+                         jsonString('storage') + jsonString('fpreal32') +
+                         jsonString('packing') + '[' + jsonInt(3) + ']' +
+                         jsonString('pagesize') + jsonInt(1024) +
+                         jsonString('rawpagedata') + '\x40\x19' + jsonLength(points * 3))
+        for start in range(0, points, chunkPoints):
+            count = min(chunkPoints, points - start)
+            random.uniform(-10, 10, (count, 3)).astype('<f4').tofile(outputFile)
+        outputFile.write(']]]')
+        if ids:
+            outputFile.write('[[' + jsonString('scope') + jsonString('public') +
+                             jsonString('type') + jsonString('numeric') +
+                             jsonString('name') + jsonString('id') + '][' +
+                             jsonString('size') + jsonInt(1) +
+                             jsonString('storage') + jsonString('int32') +
+                             jsonString('values') + '[' + jsonString('size') + jsonInt(1) +
+                             jsonString('storage') + jsonString('int32') +
+                             jsonString('arrays') + '[\x40\x13' + jsonLength(points))
+            for start in range(0, points, chunkPoints):
+                count = min(chunkPoints, points - start)
+                arange(start, start + count, dtype='<i4').tofile(outputFile)
+            outputFile.write(']]]]')
+        outputFile.write(']]' + jsonString('primitives') + '[]]')
+    finally:
+        outputFile.close()
+
+
+def makeSequence(directory, fileFormat, points, ids, frames):
+    """Writes a synthetic sequence and returns its file names, each frame differs"""
+    extension = '.pc.classic' if fileFormat == 'ascii' else '.bgeo'
+    writeCloud = writeAsciiCloud if fileFormat == 'ascii' else writeBinaryCloud
+    sourceFiles = []
+    for frame in range(1, frames + 1):
+        fileName = path.join(directory, 'bench_%s_%d_%s.%04d%s' %
+                             (fileFormat, points, 'ids' if ids else 'noids', frame, extension))
+        writeCloud(fileName, points, ids, frame)
+        sourceFiles.append(fileName)
+    return sourceFiles
+
+
+def quiet():
+    """Silences the converter's progress output inside a measurement process"""
+    sys.stdout = open(devnull, 'w')
+    simplefilter('ignore')
+
+
+def measureFrame(sourceFile, outputDirectory):
+    """Times converting one frame the way the Point Converter does, run in its own process
+
+    The stage times come from convertPcToPdc's metrics, a streamed frame
+    spends its time parsing and writing.
+    """
+    quiet()
+    metrics = converter.convertPcToPdc(sourceFile, 'benchShape', 1, 1, 250, outputDirectory, 0)
+    timings = dict((stage, metrics[stage]) for stage in
+                   ('parse', 'group', 'pack', 'write', 'total', 'bytesWritten'))
+    timings['peakRss'] = peakRss()
+    return timings
+
+
+def measureSequence(sourceFiles, outputDirectory, workers):
+    """Times converting a whole sequence through threadme, run in its own process"""
+    quiet()
+    started = time()
+    failures = converter.threadme(sourceFiles, 1, len(sourceFiles), 'benchShape',
+                                  outputDirectory, 0, threadlimit=workers, incremental=False)
+    return {'total': time() - started, 'failures': len(failures), 'peakRss': peakRss()}
+
+
+measurements = {'frame': measureFrame, 'sequence': measureSequence}
+
+
+def measure(kind, arguments):
+    """Runs a measurement in a fresh interpreter and returns what it reported
+
+    A forked child starts with its parent's peak memory already counted,
+    so the measurement is run by starting this script again with
+    --measure, and its result is passed back through a temporary file.
+    """
+    handle, resultFile = mkstemp(suffix='.json')
+    close(handle)
+    try:
+        with open(devnull, 'w') as silent:
+            check_call([sys.executable, path.abspath(__file__), '--measure', kind,
+                        dumps(arguments), resultFile], stdout=silent)
+        with open(resultFile, 'r') as readFile:
+            return load(readFile)
+    finally:
+        remove(resultFile)
+
+
+def runMeasurement(argv):
+    """Runs one measurement started by measure and writes its result to a file"""
+    kind, arguments, resultFile = argv
+    result = measurements[kind](*loads(arguments))
+    with open(resultFile, 'w') as writeFile:
+        dump(result, writeFile)
+    return 0
+
+
+def main(argv):
+    """Runs the benchmark and writes one JSON result per line"""
+    parser = ArgumentParser(description='Benchmark the Houdini to Maya point converter.')
+    parser.add_argument('--sizes', help='comma separated point counts (10000,100000,1000000)')
+    parser.add_argument('--full', action='store_true',
+                        help='run every size from 10K to 50M points')
+    parser.add_argument('--formats', default='ascii,binary', help='ascii, binary or both')
+    parser.add_argument('--frames', type=int, default=4,
+                        help='frames in the sequence benchmark, 0 skips it (4)')
+    parser.add_argument('-w', '--workers', type=int, help='worker processes (core count)')
+    parser.add_argument('-d', '--directory', help='where to write test files (a temp folder)')
+    parser.add_argument('--keep', action='store_true', help='keep the generated files')
+    parser.add_argument('-o', '--output', help='file to append results to (stdout)')
+    args = parser.parse_args(argv)
+    if args.sizes:
+        sizes = [int(size) for size in args.sizes.split(',')]
+    else:
+        sizes = fullSizes if args.full else defaultSizes
+    directory = args.directory or mkdtemp(prefix='pointbenchmark')
+    converter.makeProjectFolders(directory)
+    output = open(args.output, 'a') if args.output else sys.stdout
+    common = {'converter': converter.fileDigest(converterFile),
+              'date': datetime.now().isoformat(), 'python': pythonVersion.split()[0],
+              'platform': platform}
+    try:
+        for fileFormat in args.formats.split(','):
+            for points in sizes:
+                for ids in (True, False):
+                    sourceFiles = makeSequence(directory, fileFormat, points, ids,
+                                               max(args.frames, 1))
+                    result = dict(common, benchmark='frame', format=fileFormat,
+                                  points=points, ids=ids, frames=1,
+                                  inputBytes=path.getsize(sourceFiles[0]))
+                    result.update(measure('frame', (sourceFiles[0], directory)))
+                    result['pointsPerSecond'] = points / max(result['total'], 1e-9)
+                    output.write(dumps(result, sort_keys=True) + '\n')
+                    output.flush()
+                    if args.frames > 1:
+                        result = dict(common, benchmark='sequence', format=fileFormat,
+                                      points=points, ids=ids, frames=len(sourceFiles),
+                                      workers=args.workers or converter.cpu_count(),
+                                      inputBytes=sum(path.getsize(f) for f in sourceFiles))
+                        result.update(measure('sequence',
+                                              (sourceFiles, directory, args.workers)))
+                        result['pointsPerSecond'] = (points * len(sourceFiles) /
+                                                     max(result['total'], 1e-9))
+                        output.write(dumps(result, sort_keys=True) + '\n')
+                        output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if not args.keep and not args.directory:
+            rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    freeze_support()
+    if sysargv[1:2] == ['--measure']:
+        sysexit(runMeasurement(sysargv[2:]))
+    sysexit(main(sysargv[1:]))
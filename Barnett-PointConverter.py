@@ -36,14 +36,18 @@ Read First:
  Houdini into Autodesk Maya.
 *Currently this only works with Houdini's .bgeo or .pc filetype    
  but will hopefully work with more soon.
-*If you are using Houdini 12 or newer you will need to 
- add .classic to the extension (.pc.classic or .bgeo.classic). 
- Houdini now uses binary files instead of ascii, .classic forces
- it back into ascii mode.
-*As of now it only transfers point location and id attributes, if 
- no id exists it will create ids in order of location.
+*Houdini 12 and newer save .bgeo and .pc files in a binary 
+ format, these can be selected directly. Ascii files exported 
+ with .classic on the extension (.pc.classic or .bgeo.classic)
+ still work but are larger and slower to convert.
+*Point location and id attributes are always transferred, if 
+ no id exists it will create ids in order of location. Other 
+ point attributes (Cd, v, pscale, age, N...) can be listed under
+ Extra Attributes and are written with Maya's per particle names
+ (rgbPP, velocity, radiusPP, age, normalPP...).
 *For the second tool to work you must have Autodesk Maya installed, 
   either versions 2012 or 2013. Other versions are untested.
+*The Point Converter tool needs NumPy installed alongside PyQt4.
 
 Three Easy Steps:
 -----------------
@@ -59,6 +63,9 @@ Important Notes:
  sequence.
 *For example, if you import frames 30-50 into Maya, 1-29 will    
  automatically be empty cache files.
+*Source files are placed on frames by the frame number in their 
+ file names, so a frame missing from the sequence stays empty 
+ instead of shifting the frames after it.
 *A series of folders will be created in the directory you choose 
  if they don't already exist.
 *Those folders are called scenes, particles, data and backup.
@@ -68,6 +75,9 @@ Important Notes:
  folder are for backups of the cache and scene.
 *If you modify the cache in the particles folder, you can replace the
  cache with the original in the data folder.
+*The Point Converter keeps a <name>Shape.manifest.json file in the
+ data folder and skips frames whose source file hasn't changed
+ since they were converted. Delete it to convert everything again.
 *It will set the current scenes project folder to whichever 
  folder you choose as the directory.
 *Changing the name of the scene will normally break the cache, so 
@@ -98,238 +108,2719 @@ Using Multiple Caches:
 '''
 
 
-from re import search
+from re import compile as recompile
 from re import split as resplit
 from sys import argv as sysargv
 from sys import exit as sysexit
+from argparse import ArgumentParser
+from glob import glob
+from sys import platform
 from os import path
 from os import makedirs
+from os import remove
+from os import rename
+from os import stat
+from os import getpid
+from os import open as osopen
+from os import close as osclose
+from os import write as oswrite
+from os import O_CREAT
+from os import O_EXCL
+from os import O_WRONLY
+from errno import EACCES
+from errno import EEXIST
+from socket import gethostname
+from contextlib import contextmanager
+from copy import deepcopy
+from shutil import copyfile
+from hashlib import sha1
+from mmap import mmap
+from mmap import ACCESS_READ
+from json import dump
+from json import dumps
+from csv import DictWriter
+from collections import OrderedDict
+from json import load
+from struct import calcsize
 from struct import pack
+from struct import unpack
 from struct import Struct
-from PyQt4 import QtCore
-from PyQt4 import QtGui
-from multiprocessing import Process
-from multiprocessing import Lock
+from string import maketrans
+from zlib import compressobj
+from zlib import crc32
+from zlib import decompressobj
+from numpy import arange
+from numpy import argsort
+from numpy import array
+from numpy import ascontiguousarray
+from numpy import atleast_1d
+from numpy import column_stack
+from numpy import concatenate
+from numpy import cumsum
+from numpy import diff
+from numpy import dtype
+from numpy import empty
+from numpy import floor
+from numpy import frombuffer
+from numpy import fromstring
+from numpy import lexsort
+from numpy import minimum
+from numpy import nonzero
+from numpy import ones
+from numpy import repeat
+from numpy import searchsorted
+from numpy import sort
+from numpy import zeros
+from multiprocessing import Pool
+from multiprocessing import cpu_count
 from multiprocessing import freeze_support
+from threading import Condition
+from traceback import format_exc
+from ctypes import Structure
+from ctypes import byref
+from ctypes import c_ulong
+from ctypes import c_ulonglong
+from ctypes import sizeof
+from time import sleep
 from time import time
 from warnings import warn
 
+try:
+    from PyQt4 import QtCore
+    from PyQt4 import QtGui
+except ImportError:
+    QtCore = None
+    QtGui = None
+try:
+    from ctypes import windll
+except ImportError:
+    windll = None
+try:
+    from os import link
+except ImportError:
+    link = None
+try:
+    from psutil import virtual_memory
+    from psutil import Process as PsutilProcess
+except ImportError:
+    virtual_memory = None
+    PsutilProcess = None
+try:
+    from resource import getrusage
+    from resource import RUSAGE_SELF
+except ImportError:
+    getrusage = None
 try:
     _fromUtf8 = QtCore.QString.fromUtf8
 except AttributeError:
     _fromUtf8 = lambda s: s
 
-def convertPcToPdc(deffile, particlesName, startframe, endframe, pdcIncrements,
-                   outputDirectory, questionasked):
-    '''Converts Houdini's Point Cache file to Maya's Point Disc Cach file'''
-    print "time(): %f " %  time()
-    print 'ReadFile:'
-    dataType = {'Integer': 0, 'Integer Array': 1, 'Double': 2,
-                    'Double Array': 3, 'Vector': 4, 'Vector Array': 5}
-    readFile = open(str(deffile), 'r', buffering=1024*10)
-    fileContent = readFile.read()
-    content = resplit('\[|\]| |', fileContent)
-    readFile.close()
-    count = 0
-    del fileContent
-    vartest = 0
-    vartest1 = 0
-    vartesta = 0
-    vartestb = 0
-    vartestc = 0
-    vartestd = 0
-    noIds = 0
-    noCoords = 0
-    for count, item in enumerate(content):
-        if search('\"P\"', item):
-           index1 = count
-           vartest = 1
-        if search('\"id\"', item):
-           index2 = count
-           vartest1 = 1
-        if vartest == 1:
-            if vartesta == 0:
-                if search('$^', item):
-                   if count > index1:
-                       index3 = count
-                       vartesta = 1
-            if vartesta == 1:           
-                if vartestb == 0: 
-                    if search('\"', item):
-                       if count > index3:
-                           index4 = count
-                           vartestb = 1
-            if vartest1 == 1:           
-                if vartestc == 0:
-                    if search('$^', item):
-                       if count > index2:
-                           index5 = count
-                           vartestc = 1   
-                if vartestc == 1:
-                    if vartestd == 0:
-                        if search('\"', item):
-                           if count > index5:
-                               index6 = count
-                               vartestd = 1
-    if vartest == 1:
-       coords = content[(index3 + 1):index4]
-    if vartest == 0:
-       raise RuntimeError('No Coords found in file, is this a .pc.classic or .bgeo.classic file?')
-    print "time(): %f " %  time()
-    print 'Grouping:'
-    tempString = ','.join(str(n) for n in coords)
-    del coords
-    running = True
-    while running:    
-        if tempString[-1].isdigit() == False:
-            tempString = tempString[:-1]
+dataType = {'Integer': 0, 'Integer Array': 1, 'Double': 2,
+            'Double Array': 3, 'Vector': 4, 'Vector Array': 5}
+pdcHeader = Struct('>4sii2iii')
+archiveHeader = Struct('>4sIQ')
+deltaHeader = Struct('>4sIQi')
+pdcRecordForms = {0: '>i4', 1: '>i4', 2: '>f8', 3: '>f8', 4: '>f8', 5: '>f8'}
+nCacheChannelTypes = {0: ('DBLA', 'DoubleArray'), 1: ('DBLA', 'DoubleArray'),
+                      2: ('DBLA', 'DoubleArray'), 3: ('DBLA', 'DoubleArray'),
+                      4: ('DVCA', 'DoubleVectorArray'), 5: ('DVCA', 'DoubleVectorArray')}
+nCacheSingleChannelTypes = {2: ('FBCA', 'FloatArray'), 3: ('FBCA', 'FloatArray'),
+                            4: ('FVCA', 'FloatVectorArray'), 5: ('FVCA', 'FloatVectorArray')}
+nCacheChannelForms = {'DBLA': '>f8', 'DVCA': '>f8', 'FBCA': '>f4', 'FVCA': '>f4'}
+nCacheChannelNames = {'particleId': 'id'}
+mayaAttributeNames = {'P': 'position', 'id': 'particleId', 'Cd': 'rgbPP', 'v': 'velocity',
+                      'pscale': 'radiusPP', 'age': 'age', 'life': 'lifespanPP',
+                      'Alpha': 'opacityPP', 'N': 'normalPP', 'mass': 'mass'}
+splitThreshold = 256 * 1024 * 1024
+splitPieceSize = 16 * 1024 * 1024
+streamMemory = 64 * 1024 * 1024
+framePattern = recompile(r'(#+)|\$F(\d?)')
+frameNumberPattern = recompile(r'(\d+)\D*$')
+ticksPerSecond = 6000
+numberSeparators = maketrans('[],', '   ')
+metricFields = ['source', 'pdc', 'worker', 'points', 'bytesRead', 'bytesWritten', 'parse',
+                'group', 'pack', 'write', 'lod', 'archive', 'bytesArchived', 'total',
+                'pointsPerSecond', 'workerPeakRss', 'error']
+
+
+def keptComponents(size, wanted):
+    """Returns how many components of an attribute tuple are kept, None keeps them all"""
+    if wanted is None:
+        return size
+    return min(size, wanted)
+
+
+def parseNumbers(text):
+    """Parses a run of comma, space or bracket separated numbers in one pass"""
+    return fromstring(text.translate(numberSeparators), sep=' ')
+
+
+def keptValues(values, position, size, keep):
+    """Drops all but the first keep components of each tuple from part of a block
+
+    position is how many numbers of the block came before values.
+    """
+    if keep < size:
+        return values[(arange(position, position + len(values)) % size) < keep]
+    return values
+
+
+class AsciiGeoReader(object):
+    """Streams point attribute values out of an ascii Houdini geometry file
+
+    The file is read a chunk at a time and walked with a small state machine
+    that only keeps the values of the requested point attributes, so memory
+    use does not grow with the size of the file being read. Consecutive
+    numbers, along with the brackets between them, come out as a single
+    run token that is parsed in bulk by parseNumbers. Reading stops as soon
+    as every requested attribute is found or the point attributes end.
+    """
+    tokenPattern = recompile(r'"(?:[^"\\]|\\.)*"|"[^"]*\Z|'
+                             r'[^\s\[\]{},:"]+(?:[\s,\[\]]+[^\s\[\]{},:"]+)*|[\[\]{}]')
+    blockKeys = ('tuples', 'arrays')
+
+    def __init__(self, deffile, attributes, chunkSize=1024*1024):
+        self.deffile = str(deffile)
+        self.attributes = dict(attributes)
+        self.chunkSize = chunkSize
+        self.pointCount = None
+        self.sizes = {}
+        self.storages = {}
+        self.found = set()
+
+    def tokens(self):
+        """Yields tokens from the file, carrying partial tokens across chunks"""
+        readFile = open(self.deffile, 'r', buffering=1024*10)
+        try:
+            leftover = ''
+            while True:
+                chunk = readFile.read(self.chunkSize)
+                eof = not chunk
+                chunk = leftover + chunk
+                leftover = ''
+                end = len(chunk)
+                for match in self.tokenPattern.finditer(chunk):
+                    token = match.group()
+                    if not eof and match.end() == end and token not in '[]{}' and \
+                       (token[0] != '"' or len(token) == 1 or token[-1] != '"'):
+                        cut = 0
+                        if token[0] != '"':
+                            cut = max(token.rfind(separator) for separator in ', \t\r\n[]') + 1
+                        if cut:
+                            yield token[:cut]
+                        leftover = token[cut:]
+                        break
+                    yield token
+                if eof:
+                    break
+        finally:
+            readFile.close()
+
+    def __iter__(self):
+        """Yields (name, values) lists for the requested attributes as they are parsed"""
+        depth = 0
+        key = None
+        current = None
+        pointAttributesDepth = None
+        blockDepth = None
+        position = 0
+        size = 1
+        keep = 1
+        for token in self.tokens():
+            if blockDepth is not None:
+                if token == '[' or token == '{':
+                    depth += 1
+                elif token == ']' or token == '}':
+                    depth -= 1
+                    if depth < blockDepth:
+                        self.found.add(current)
+                        if len(self.found) == len(self.attributes):
+                            return
+                        blockDepth = None
+                        current = None
+                else:
+                    depth += token.count('[') - token.count(']')
+                    values = parseNumbers(token)
+                    if len(values):
+                        yield current, keptValues(values, position, size, keep)
+                    position += len(values)
+                continue
+            if token == '[' or token == '{':
+                depth += 1
+                if key == 'pointattributes':
+                    pointAttributesDepth = depth
+                elif key in self.blockKeys and current is not None:
+                    blockDepth = depth
+                    position = 0
+                    size = self.sizes[current]
+                    keep = keptComponents(size, self.attributes[current])
+                key = None
+            elif token == ']' or token == '}':
+                if depth == pointAttributesDepth:
+                    return
+                depth -= 1
+                key = None
+            elif token[0] == '"':
+                token = token[1:-1]
+                if key == 'name' and pointAttributesDepth is not None:
+                    if token in self.attributes and token not in self.found:
+                        current = token
+                    else:
+                        current = None
+                    key = None
+                elif key == 'storage' and current is not None and current not in self.storages:
+                    self.storages[current] = token
+                    key = None
+                elif key is None:
+                    key = token
+                else:
+                    key = None
+            else:
+                depth += token.count('[') - token.count(']')
+                if key == 'pointcount' and self.pointCount is None:
+                    self.pointCount = int(token)
+                elif key == 'size' and current is not None and current not in self.sizes:
+                    self.sizes[current] = int(token)
+                key = None
+
+
+class MappedAsciiGeoReader(object):
+    """Reads point attributes from an ascii Houdini geometry file through mmap
+
+    The point count and each attribute's number block are located with
+    byte searches over the mapped file, and only the blocks that were asked
+    for are parsed, a slice at a time, straight out of the mapping. Nothing
+    is copied into the heap wholesale and workers reading the same file
+    share the operating system's page cache.
+    """
+    bracketPattern = recompile(r'[\[\]]')
+    sectionEnds = ('"primitiveattributes"', '"globalattributes"', '"primitives"')
+
+    def __init__(self, deffile, attributes, chunkSize=1024*1024):
+        self.deffile = str(deffile)
+        self.attributes = dict(attributes)
+        self.chunkSize = chunkSize
+        self.pointCount = None
+        self.sizes = {}
+        self.storages = {}
+        self.found = set()
+
+    def readValue(self, mapped, position):
+        """Returns the scalar or string after the key that ends at position"""
+        start = position
+        while mapped[start] in ' \t\r\n,:':
+            start += 1
+        end = start + 1
+        if mapped[start] == '"':
+            end = mapped.find('"', start + 1) + 1
+            return mapped[start + 1:end - 1], end
+        while mapped[end] not in ' \t\r\n,]}':
+            end += 1
+        return mapped[start:end], end
+
+    def blockEnd(self, mapped, start):
+        """Returns the offset just past the bracket closing the block opened at start
+
+        A number block holds no strings, so it closes before the next quote.
+        Brackets up to the last number before that quote are counted a chunk
+        at a time and only the short run of brackets after it is walked.
+        """
+        limit = mapped.find('"', start)
+        if limit < 0:
+            limit = len(mapped)
+        last = limit
+        while last > start and mapped[last - 1] in ' \t\r\n,[]{}':
+            last -= 1
+        depth = 0
+        for position in range(start, last, self.chunkSize):
+            chunk = mapped[position:min(position + self.chunkSize, last)]
+            depth += chunk.count('[') - chunk.count(']')
+        for bracket in self.bracketPattern.finditer(mapped[last:limit]):
+            depth += 1 if bracket.group() == '[' else -1
+            if depth == 0:
+                return last + bracket.end()
+        raise RuntimeError('Unterminated attribute block in %s' % self.deffile)
+
+    def parseBlock(self, mapped, start, end, size, keep):
+        """Yields the kept components of a number block one slice at a time"""
+        offset = 0
+        position = start
+        while position < end:
+            stop = min(position + self.chunkSize, end)
+            if stop < end:
+                cut = mapped.rfind(',', position, stop)
+                if cut < 0:
+                    cut = mapped.find(',', stop, end)
+                stop = cut + 1 if cut >= 0 else end
+            values = parseNumbers(mapped[position:stop])
+            yield keptValues(values, offset, size, keep)
+            offset += len(values)
+            position = stop
+
+    def blocks(self, mapped):
+        """Yields (name, blockStart, blockEnd, size, keep) for each requested attribute's numbers"""
+        attributesStart = mapped.find('"pointattributes"')
+        if attributesStart < 0:
+            return
+        countStart = mapped.find('"pointcount"', 0, attributesStart)
+        if countStart >= 0:
+            self.pointCount = int(self.readValue(mapped, countStart + 12)[0])
+        attributesEnd = len(mapped)
+        for key in self.sectionEnds:
+            keyStart = mapped.find(key, attributesStart)
+            if keyStart >= 0:
+                attributesEnd = min(attributesEnd, keyStart)
+        position = attributesStart
+        while len(self.found) < len(self.attributes):
+            nameStart = mapped.find('"name"', position, attributesEnd)
+            if nameStart < 0:
+                break
+            name, position = self.readValue(mapped, nameStart + 6)
+            if name not in self.attributes or name in self.found:
+                continue
+            sizeStart = mapped.find('"size"', position, attributesEnd)
+            nextName = mapped.find('"name"', position, attributesEnd)
+            if nextName < 0:
+                nextName = attributesEnd
+            blockStart = -1
+            for key in ('"tuples"', '"arrays"'):
+                keyStart = mapped.find(key, sizeStart, nextName)
+                if keyStart >= 0 and (blockStart < 0 or keyStart < blockStart):
+                    blockStart = keyStart
+            if sizeStart < 0 or blockStart < 0:
+                raise RuntimeError('Unsupported layout for attribute %s in %s' %
+                                   (name, self.deffile))
+            size = int(self.readValue(mapped, sizeStart + 6)[0])
+            self.sizes[name] = size
+            storageStart = mapped.find('"storage"', sizeStart, blockStart)
+            if storageStart >= 0:
+                self.storages[name] = self.readValue(mapped, storageStart + 9)[0]
+            blockStart = mapped.find('[', blockStart)
+            position = self.blockEnd(mapped, blockStart)
+            yield name, blockStart, position, size, keptComponents(size, self.attributes[name])
+            self.found.add(name)
+
+    def __iter__(self):
+        """Yields (name, values) arrays for the requested attributes"""
+        readFile = open(self.deffile, 'rb')
+        mapped = mmap(readFile.fileno(), 0, access=ACCESS_READ)
+        try:
+            for name, start, end, size, keep in self.blocks(mapped):
+                for values in self.parseBlock(mapped, start, end, size, keep):
+                    yield name, values
+        finally:
+            mapped.close()
+            readFile.close()
+
+
+def decodeAttributeBlock(values, size, layout, pointCount):
+    """Reorders a parsed attribute block into a (points, size) array
+
+    Handles the plain "tuples"/"arrays" layouts as well as Houdini's paged
+    "rawpagedata" layout, where each page stores every subvector of its
+    packing in turn and constant pages store a single tuple.
+    """
+    if layout.get('block') != 'rawpagedata':
+        return values.reshape(-1, size)
+    packing = [int(p) for p in concatenate([atleast_1d(p) for p in
+                                            layout.get('packing', [size])])]
+    pageSize = int(atleast_1d(layout['pagesize'][0])[0])
+    constantFlags = layout.get('constantpageflags')
+    if pointCount is None:
+        pointCount = len(values) // size
+    if packing == [size] and not constantFlags:
+        return values[:pointCount * size].reshape(-1, size)
+    output = empty((pointCount, size), dtype=values.dtype)
+    position = 0
+    for page, start in enumerate(range(0, pointCount, pageSize)):
+        count = min(pageSize, pointCount - start)
+        component = 0
+        for subvector, width in enumerate(packing):
+            if constantFlags and constantFlags[subvector][page]:
+                output[start:start + count, component:component + width] = \
+                    values[position:position + width]
+                position += width
+            else:
+                output[start:start + count, component:component + width] = \
+                    values[position:position + count * width].reshape(count, width)
+                position += count * width
+            component += width
+    return output
+
+
+class BlockStream(object):
+    """Cuts an attribute block that arrives in pieces into chunks of whole tuples
+
+    Pieces are gathered until there are chunkValues values, so a block
+    stored as one small array per point isn't yielded a point at a time.
+    Values past the last whole tuple are carried into the next chunk, and
+    anything past limit values (the padding after the last point of a
+    paged block) is dropped.
+    """
+    def __init__(self, size, keep, limit=None, chunkValues=128*1024):
+        self.size = size
+        self.keep = keep
+        self.limit = limit
+        self.chunkValues = chunkValues
+        self.taken = 0
+        self.pending = []
+        self.pendingCount = 0
+
+    def push(self, values):
+        """Returns the kept components of a chunk of whole tuples once there's one, flattened"""
+        if self.limit is not None:
+            values = values[:max(self.limit - self.taken, 0)]
+        self.taken += len(values)
+        self.pending.append(values)
+        self.pendingCount += len(values)
+        if self.pendingCount < self.chunkValues:
+            return values[:0]
+        return self.take()
+
+    def take(self):
+        values = concatenate(self.pending) if len(self.pending) > 1 else self.pending[0]
+        whole = len(values) // self.size * self.size
+        self.pending = [values[whole:]] if whole < len(values) else []
+        self.pendingCount = len(values) - whole
+        return values[:whole].reshape(-1, self.size)[:, :self.keep].ravel()
+
+    def finish(self):
+        """Returns the last chunk, raising an error if the block doesn't end on a whole tuple"""
+        values = self.take() if self.pending else empty(0)
+        if self.pending:
+            raise RuntimeError('attribute values do not divide into whole tuples')
+        return values
+
+
+class BinaryGeoReader(object):
+    """Reads point attribute values out of Houdini's binary JSON geometry
+
+    Houdini 12 and newer save .bgeo and .pc files in this format by
+    default. Numeric arrays are stored as packed uniform arrays, which are
+    read a chunk at a time and yielded as they go (see BlockStream), and
+    arrays that aren't needed are seeked past without being read. Paged
+    blocks whose pages interleave several subvectors or hold constant
+    pages are decoded whole. Reading stops as soon as every requested
+    attribute is found or the point attributes end.
+    """
+    blockKeys = ('tuples', 'arrays', 'rawpagedata')
+    layoutKeys = ('packing', 'pagesize', 'constantpageflags')
+    # Token ids below follow Houdini's binary JSON spec (UT_JID)
+    numberTypes = {0x11: 'i1', 0x12: 'i2', 0x13: 'i4', 0x14: 'i8', 0x18: 'f2',
+                   0x19: 'f4', 0x1a: 'f8', 0x21: 'u1', 0x22: 'u2'}
+
+    def __init__(self, deffile, attributes, chunkSize=1024*1024):
+        self.deffile = str(deffile)
+        self.attributes = dict(attributes)
+        self.chunkSize = chunkSize
+        self.pointCount = None
+        self.sizes = {}
+        self.storages = {}
+        self.found = set()
+        self.endian = '<'
+        self.tokens = {}
+
+    def readLength(self, readFile):
+        """Reads one of the variable sized lengths used throughout the format"""
+        length = ord(readFile.read(1))
+        if length < 0xf1:
+            return length
+        lengthForms = {0xf2: 'H', 0xf4: 'I', 0xf8: 'Q'}
+        if length not in lengthForms:
+            raise RuntimeError('Bad length marker in binary geometry file')
+        form = self.endian + lengthForms[length]
+        return unpack(form, readFile.read(calcsize(form)))[0]
+
+    def readString(self, readFile):
+        return readFile.read(self.readLength(readFile))
+
+    def readUniformHeader(self, readFile):
+        """Reads the type and length of a uniform array, returns (jid, length, byteCount)"""
+        jid = ord(readFile.read(1))
+        length = self.readLength(readFile)
+        if jid == 0x10:
+            byteCount = (length + 31) // 32 * 4
+        elif jid in self.numberTypes:
+            byteCount = length * int(self.numberTypes[jid][1])
         else:
-            running = False
-    tempString += ',,,'
-    print "time(): %f " %  time()
-    print 'Coords: '
-    s = ''.join(tempString.split())
-    del tempString
-    split = s.split(",")
-    outputs = [' '.join(split[6*i:6*i+3]) for i in range(len(split)//6)]
-    outputs = ' '.join(outputs)
-    outputs = outputs.split(' ')
-    coords = tuple(float(f) for f in outputs)
-    del outputs
-    if vartest1 == 0:
-        noIds = 1
-        numberofids = len(coords)/3 
-        ids = range(numberofids)
-        ids = [float(x) for x in ids]
-        ids = tuple(ids)
-    if vartest1 == 1:
-        ids = content[index5:index6]
-        print "time(): %f " %  time()
-        print 'Ids: '
-        tempString2 = ','.join(str(n) for n in ids)
-        running = True
-        while running:    
-            if tempString2[-1].isdigit() == False:
-                tempString2 = tempString2[:-1]
+            raise RuntimeError('Unsupported uniform array type %#x' % jid)
+        return jid, length, byteCount
+
+    def decodeUniform(self, data, jid, length):
+        if jid == 0x10:
+            words = frombuffer(data, dtype=self.endian + 'u4')
+            bits = (words[:, None] >> arange(32, dtype='u4')) & 1
+            return bits.ravel()[:length].astype(bool)
+        return frombuffer(data, dtype=self.endian + self.numberTypes[jid])
+
+    def readUniform(self, readFile, keep):
+        """Reads or skips a uniform array, returning it as a NumPy array"""
+        jid, length, byteCount = self.readUniformHeader(readFile)
+        if not keep:
+            readFile.seek(byteCount, 1)
+            return None
+        return self.decodeUniform(readFile.read(byteCount), jid, length)
+
+    def readUniformChunks(self, readFile):
+        """Reads a uniform array a chunk at a time, yielding NumPy arrays"""
+        jid, length, byteCount = self.readUniformHeader(readFile)
+        if jid == 0x10:
+            yield self.decodeUniform(readFile.read(byteCount), jid, length)
+            return
+        itemSize = int(self.numberTypes[jid][1])
+        chunkBytes = max(self.chunkSize // itemSize, 1) * itemSize
+        while byteCount > 0:
+            data = readFile.read(min(chunkBytes, byteCount))
+            if not data:
+                raise RuntimeError('%s ends in the middle of an attribute' % self.deffile)
+            byteCount -= len(data)
+            yield self.decodeUniform(data, jid, len(data) // itemSize)
+
+    def blockStream(self, name, blockKey, layout):
+        """Returns a BlockStream for an attribute's block, or None if it has to be decoded whole"""
+        if name not in self.sizes:
+            return None
+        size = self.sizes[name]
+        keep = keptComponents(size, self.attributes[name])
+        chunkValues = max(self.chunkSize // 4, size)
+        if blockKey != 'rawpagedata':
+            return BlockStream(size, keep, chunkValues=chunkValues)
+        packing = [int(p) for p in concatenate([atleast_1d(p) for p in
+                                                layout.get('packing', [size])])]
+        if packing != [size] or layout.get('constantpageflags'):
+            return None
+        limit = self.pointCount * size if self.pointCount is not None else None
+        return BlockStream(size, keep, limit, chunkValues)
+
+    def readScalar(self, readFile, jid):
+        """Reads a single boolean or number value"""
+        if jid == 0x10:
+            return ord(readFile.read(1)) != 0
+        dtype = self.endian + self.numberTypes[jid]
+        return frombuffer(readFile.read(int(dtype[-1])), dtype=dtype)[0]
+
+    def __iter__(self):
+        """Yields (name, values) arrays for the requested attributes"""
+        readFile = open(self.deffile, 'rb')
+        try:
+            magic = readFile.read(5)
+            if magic[:1] != '\x7f' or magic[1:] not in ('NSJb', 'bJSN'):
+                raise RuntimeError('%s is not a binary Houdini geometry file' % self.deffile)
+            self.endian = '<' if magic[1:] == 'NSJb' else '>'
+            depth = 0
+            key = None
+            current = None
+            pointAttributesDepth = None
+            captureKey = None
+            captureDepth = None
+            captured = []
+            layout = {}
+            stream = None
+            while len(self.found) < len(self.attributes):
+                byte = readFile.read(1)
+                if not byte:
+                    break
+                jid = ord(byte)
+                value = None
+                isString = False
+                if jid == 0x5b or jid == 0x7b:
+                    depth += 1
+                    if key == 'pointattributes':
+                        pointAttributesDepth = depth
+                    key = None
+                    continue
+                elif jid == 0x5d or jid == 0x7d:
+                    if depth == pointAttributesDepth:
+                        break
+                    depth -= 1
+                    key = None
+                    if captureKey is not None and depth < captureDepth:
+                        value = captured
+                    else:
+                        continue
+                elif jid == 0x40 and stream is not None:
+                    for values in self.readUniformChunks(readFile):
+                        values = stream.push(values)
+                        if len(values):
+                            yield current, values
+                    if depth >= captureDepth:
+                        continue
+                    value = captured
+                elif jid == 0x40:
+                    value = self.readUniform(readFile, current is not None)
+                elif jid == 0x27:
+                    value = self.readString(readFile)
+                    isString = True
+                elif jid == 0x2b:
+                    tokenId = self.readLength(readFile)
+                    self.tokens[tokenId] = self.readString(readFile)
+                    continue
+                elif jid == 0x26:
+                    value = self.tokens[self.readLength(readFile)]
+                    isString = True
+                elif jid == 0x2d:
+                    self.tokens.pop(self.readLength(readFile), None)
+                    continue
+                elif jid == 0x30 or jid == 0x31:
+                    value = jid == 0x31
+                elif jid == 0x10 or jid in self.numberTypes:
+                    value = self.readScalar(readFile, jid)
+                elif jid in (0x00, 0x3a, 0x2c):
+                    continue
+                else:
+                    raise RuntimeError('Unknown token %#x in binary geometry file' % jid)
+                if captureKey is not None and value is not captured:
+                    if stream is not None:
+                        values = stream.push(atleast_1d(value))
+                        if len(values):
+                            yield current, values
+                        if depth >= captureDepth:
+                            continue
+                    elif depth >= captureDepth:
+                        captured.append(value)
+                        continue
+                    else:
+                        captured = [value]
+                if captureKey is not None:
+                    layout[captureKey] = captured
+                    if stream is not None:
+                        yield current, stream.finish()
+                        self.found.add(current)
+                        current = None
+                        stream = None
+                    elif captureKey in self.blockKeys:
+                        layout['block'] = captureKey
+                        values = concatenate([atleast_1d(v) for v in captured])
+                        block = decodeAttributeBlock(values, self.sizes[current],
+                                                     layout, self.pointCount)
+                        keep = keptComponents(self.sizes[current], self.attributes[current])
+                        yield current, block[:, :keep].ravel()
+                        self.found.add(current)
+                        current = None
+                    key = None
+                    captureKey = None
+                    captureDepth = None
+                    captured = []
+                    continue
+                if isString:
+                    if key == 'name' and pointAttributesDepth is not None:
+                        if value in self.attributes and value not in self.found:
+                            current = value
+                            layout = {}
+                        else:
+                            current = None
+                        key = None
+                    elif key == 'storage' and current is not None and \
+                         current not in self.storages:
+                        self.storages[current] = value
+                        key = None
+                    elif key is None:
+                        key = value
+                        if current is not None and key in self.blockKeys + self.layoutKeys:
+                            captureKey = key
+                            captureDepth = depth + 1
+                            captured = []
+                            if key in self.blockKeys:
+                                stream = self.blockStream(current, key, layout)
+                    else:
+                        key = None
+                else:
+                    if key == 'pointcount' and self.pointCount is None:
+                        self.pointCount = int(value)
+                    elif key == 'size' and current is not None and current not in self.sizes:
+                        self.sizes[current] = int(value)
+                    key = None
+        finally:
+            readFile.close()
+
+
+def canMap(fileName):
+    """Checks a file can be memory mapped
+
+    Mapping fails for empty files, and for files bigger than the address
+    space of a 32 bit Python.
+    """
+    with open(str(fileName), 'rb') as readFile:
+        try:
+            mmap(readFile.fileno(), 0, access=ACCESS_READ).close()
+        except (ValueError, OverflowError, EnvironmentError):
+            return False
+    return True
+
+
+def openGeoReader(deffile, attributes, mapped=True):
+    """Returns the reader matching the geometry file's ascii or binary format
+
+    Ascii files are read through MappedAsciiGeoReader, which finds the point
+    count and each requested attribute's block with byte searches and never
+    tokenizes anything else. Files that can't be memory mapped (see
+    canMap), or any file when mapped is False, are walked with the
+    streaming AsciiGeoReader instead.
+    """
+    readFile = open(str(deffile), 'rb')
+    try:
+        binary = readFile.read(1) == '\x7f'
+    finally:
+        readFile.close()
+    if binary:
+        return BinaryGeoReader(deffile, attributes)
+    if mapped and canMap(deffile):
+        return MappedAsciiGeoReader(deffile, attributes)
+    return AsciiGeoReader(deffile, attributes)
+
+
+def readPointBuffers(reader):
+    """Collects the reader's attribute values into contiguous big-endian buffers
+
+    Returns an ordered dict of attribute name to a float64 array shaped
+    (points, components), in the order the attributes are in the file.
+    Buffers are allocated up front from the header's point count when it
+    is known so values are copied in without growing.
+    """
+    buffers = OrderedDict()
+    filled = {}
+    pending = {}
+    for name, values in reader:
+        if name not in buffers:
+            components = keptComponents(reader.sizes[name], reader.attributes[name])
+            if reader.pointCount is not None:
+                buffers[name] = empty(reader.pointCount * components, dtype='>f8')
             else:
-                running = False
-        tempString2 = tempString2[1:]
-        ids = tempString2.split(',')
-        del tempString2
-        ids = [float(x.strip()) for x in ids]
-        ids = tuple(ids)
-    print "time(): %f " %  time()
-    print 'Set Attributes:'
-    scaleFactor = 1    
-    particlecount = (len(coords))
-    count = 0
-    num = range(len(coords))
-    attributes = ['position','particleId']
-    fileType = 'PDC ' 
-    formatVersion = 1 
-    byteOrder = 1 
-    offset = -1
-    extra1 = 0 
-    extra2 = 0 
-    particlesTotal = len(coords)/3
-    print "time(): %f " %  time()
-    print 'Set Header Values and records2:'
-    attributesTotal = 2
-    headerValues = (fileType, formatVersion, byteOrder, extra1,
-                    extra2, particlesTotal, attributesTotal)
-    recordsValues2 = (len(attributes[1 + offset]), attributes[1 + offset],
-                      dataType['Vector Array'])
-    recordsValues2 += coords
-    scaleFactor = 1
-    print "time(): %f " %  time()
-    print 'Set Records 3:'
-    recordsValues3 = (len(attributes[2 + offset]), attributes[2 + offset],
-                      dataType['Double Array'])
-    recordsValues3 += ids
-    recordsForm = ' i{0}si{1}d i{2}si{3}d'.format(str(len(attributes[1 + offset])),
-                                                      str(3* particlesTotal),
-                                                      str(len(attributes[2 + offset])),
-                                                      str(len(ids)))
-    headerForm = '>4sii2iii'
-    form = Struct(headerForm + recordsForm)
-    allValues = headerValues + recordsValues2 + recordsValues3
-    del headerValues
-    del recordsValues2
-    del recordsValues3
-    del headerForm
-    del recordsForm
-    packedData = form.pack(*allValues)
-    del allValues
-    del form
-    print "time(): %f " %  time()
-    print 'Writing File: \n'
-    fileName = particlesName + '.' + str(pdcIncrements) + ".pdc"    
-    outputPDCfile = open(outputDirectory + '\\Data\\' + fileName, 'wb')
-    outputPDCfile.write(packedData)
-    outputPDCfile.close()
-    del packedData
-    print 'done'
-    print "time(): %f " %  time()
-    if noIds == 1:
-        warn(('No Id Values were included\n'
-                       'Id values were assigned based on order of particles\n'
-                      'This may cause unexpected results, to fix add a id attribute in houdini'),
-                      DeprecationWarning)
-    
-def threadedFuntion(sourceFiles,startframe,endframe,particlesName,outputDirectory,questionasked):
+                buffers[name] = None
+                pending[name] = []
+            filled[name] = 0
+        if buffers[name] is None:
+            pending[name].append(array(values, dtype='>f8'))
+            continue
+        count = len(values)
+        buffers[name][filled[name]:filled[name] + count] = values
+        filled[name] += count
+    for name in buffers:
+        components = keptComponents(reader.sizes[name], reader.attributes[name])
+        if buffers[name] is None:
+            buffers[name] = concatenate(pending.pop(name))
+        else:
+            buffers[name] = buffers[name][:filled[name]]
+        buffers[name] = buffers[name].reshape(-1, components)
+    return buffers
+
+
+def packRecordHeader(name, recordType):
+    """Returns the name length, name and data type that start a PDC record"""
+    return pack('>i{0}si'.format(len(name)), len(name), name, recordType)
+
+
+def writePdc(fileName, particleCount, records):
+    """Writes a Maya PDC file straight from contiguous big-endian buffers
+
+    records is a list of (name, dataType, buffer) tuples. Each buffer is
+    written to disk as-is, so nothing is boxed or packed in memory first.
+    The file is written under a .part name and renamed once complete, so
+    a stopped conversion never leaves a half written PDC behind.
+    """
+    partName = fileName + '.part'
+    outputPDCfile = open(partName, 'wb')
+    try:
+        outputPDCfile.write(pdcHeader.pack('PDC ', 1, 1, 0, 0, particleCount,
+                                           len(records)))
+        for name, recordType, values in records:
+            outputPDCfile.write(packRecordHeader(name, recordType))
+            ascontiguousarray(values, dtype=pdcRecordForms[recordType]).tofile(outputPDCfile)
+        written = outputPDCfile.tell()
+    finally:
+        outputPDCfile.close()
+    if path.exists(fileName):
+        remove(fileName)
+    rename(partName, fileName)
+    return written
+
+
+class PdcStreamWriter(object):
+    """Writes a PDC file a record at a time as the attribute values are parsed
+
+    The header goes out first with the particle count, and the record count
+    is filled in when the file is closed. Values are written as each chunk
+    arrives, so only the chunk being converted is ever held in memory. A
+    record that ends up with the wrong number of values is cut back off
+    the end of the file.
+    """
+    def __init__(self, fileName, particleCount):
+        self.fileName = fileName
+        self.particleCount = particleCount
+        self.outputFile = open(fileName + '.part', 'wb')
+        self.outputFile.write(pdcHeader.pack('PDC ', 1, 1, 0, 0, particleCount, 0))
+        self.recordCount = 0
+        self.recordStart = None
+        self.recordType = None
+        self.expected = 0
+        self.written = 0
+        self.seconds = 0.0
+
+    def startRecord(self, name, recordType, components=1):
+        """Starts a new record, returns False if the one before it was dropped"""
+        complete = self.finishRecord()
+        self.recordStart = self.outputFile.tell()
+        self.recordType = recordType
+        self.expected = self.particleCount * components if recordType in (1, 3, 5) else components
+        self.written = 0
+        self.outputFile.write(packRecordHeader(name, recordType))
+        return complete
+
+    def writeValues(self, values):
+        started = time()
+        values = ascontiguousarray(values, dtype=pdcRecordForms[self.recordType])
+        values.tofile(self.outputFile)
+        self.written += values.size
+        self.seconds += time() - started
+
+    def finishRecord(self):
+        """Keeps the current record if it has a value for every particle, returns False if not"""
+        if self.recordStart is None:
+            return True
+        complete = self.written == self.expected
+        if complete:
+            self.recordCount += 1
+        else:
+            self.outputFile.seek(self.recordStart)
+            self.outputFile.truncate()
+        self.recordStart = None
+        return complete
+
+    def close(self):
+        """Finishes the file and moves it into place, returns its size in bytes"""
+        self.finishRecord()
+        written = self.outputFile.tell()
+        self.outputFile.seek(pdcHeader.size - 4)
+        self.outputFile.write(pack('>i', self.recordCount))
+        self.outputFile.close()
+        if path.exists(self.fileName):
+            remove(self.fileName)
+        rename(self.fileName + '.part', self.fileName)
+        return written
+
+    def abort(self):
+        """Throws away a partly written file"""
+        self.outputFile.close()
+        remove(self.fileName + '.part')
+
+
+def pdcContents(fileName):
+    """Returns the bytes of a PDC file
+
+    A frame that has been archived (see archivePdc) is read from its .z
+    file and one stored as a delta (see writeDeltaPdc) is rebuilt from its
+    .d file.
+    """
+    if not path.exists(fileName):
+        if path.exists(fileName + '.z'):
+            return restorePdc(fileName + '.z')
+        if path.exists(fileName + '.d'):
+            return expandPdc(fileName + '.d')
+    with open(fileName, 'rb') as readFile:
+        return readFile.read()
+
+
+def readPdc(fileName, contents=None):
+    """Reads a Maya PDC file back into its particle count and (name, dataType, values) records
+
+    Archived and delta frames are read too, see pdcContents. contents, when
+    given, is parsed instead of reading the file.
+    """
+    if contents is None:
+        contents = pdcContents(fileName)
+    magic, version, endian, _, _, particleCount, recordCount = \
+        pdcHeader.unpack_from(contents)
+    if magic != 'PDC ':
+        raise RuntimeError('%s is not a PDC file' % fileName)
+    position = pdcHeader.size
+    records = []
+    for record in range(recordCount):
+        nameLength, = unpack('>i', contents[position:position + 4])
+        name = contents[position + 4:position + 4 + nameLength]
+        recordType, = unpack('>i', contents[position + 4 + nameLength:position + 8 + nameLength])
+        position += 8 + nameLength
+        count = {0: 1, 1: particleCount, 2: 1, 3: particleCount, 4: 3,
+                 5: particleCount * 3}[recordType]
+        values = frombuffer(contents, pdcRecordForms[recordType], count, position)
+        records.append((name, recordType, values))
+        position += values.nbytes
+    return particleCount, records
+
+
+def archivePdc(fileName, level=1, chunkSize=1024*1024):
+    """Compresses a PDC file into fileName.z, removes it and returns (crc32, size, archived)
+
+    The .z file starts with the crc32 and size of the PDC it holds (see
+    archiveHeader) followed by the zlib stream, so an archive can be
+    indexed and compared against a restored copy without decompressing it.
+    """
+    checksum = 0
+    size = 0
+    compressor = compressobj(level)
+    partName = fileName + '.z.part'
+    with open(fileName, 'rb') as readFile:
+        with open(partName, 'wb') as writeFile:
+            writeFile.write(archiveHeader.pack('PDCZ', 0, 0))
+            chunk = readFile.read(chunkSize)
+            while chunk:
+                checksum = crc32(chunk, checksum)
+                size += len(chunk)
+                writeFile.write(compressor.compress(chunk))
+                chunk = readFile.read(chunkSize)
+            writeFile.write(compressor.flush())
+            archived = writeFile.tell()
+            writeFile.seek(0)
+            writeFile.write(archiveHeader.pack('PDCZ', checksum & 0xffffffff, size))
+    if path.exists(fileName + '.z'):
+        remove(fileName + '.z')
+    rename(partName, fileName + '.z')
+    remove(fileName)
+    return checksum & 0xffffffff, size, archived
+
+
+def readArchiveHeader(fileName):
+    """Returns the (crc32, size) of the PDC held in an archived .z file"""
+    with open(fileName, 'rb') as readFile:
+        magic, checksum, size = archiveHeader.unpack(readFile.read(archiveHeader.size))
+    if magic != 'PDCZ':
+        raise RuntimeError('%s is not an archived PDC file' % fileName)
+    return checksum, size
+
+
+def restorePdc(fileName, chunkSize=1024*1024):
+    """Decompresses an archived .z file and returns the PDC it holds
+
+    The contents are checked against the crc32 and size recorded when the
+    frame was archived.
+    """
+    expectedChecksum, expectedSize = readArchiveHeader(fileName)
+    decompressor = decompressobj()
+    pieces = []
+    with open(fileName, 'rb') as readFile:
+        readFile.seek(archiveHeader.size)
+        chunk = readFile.read(chunkSize)
+        while chunk:
+            pieces.append(decompressor.decompress(chunk))
+            chunk = readFile.read(chunkSize)
+    pieces.append(decompressor.flush())
+    contents = ''.join(pieces)
+    if (crc32(contents) & 0xffffffff, len(contents)) != (expectedChecksum, expectedSize):
+        raise RuntimeError('%s is damaged, its checksum does not match' % fileName)
+    return contents
+
+
+def particleIds(particleCount, records):
+    """Returns a frame's particleId values, or the particle order if it has none"""
+    for name, recordType, values in records:
+        if name == 'particleId' and recordType in (1, 3):
+            return values
+    return arange(particleCount)
+
+
+def deltaRuns(keyIds, ids):
+    """Matches each particle to the key frame particle with the same id
+
+    Returns (source, length) rows, each a run of particles that follow
+    consecutive key frame particles starting at source. Runs of particles
+    the key frame doesn't have start at -1.
+    """
+    sources = empty(len(ids), dtype='i8')
+    sources.fill(-1)
+    if len(keyIds) and len(ids):
+        order = argsort(keyIds, kind='mergesort')
+        sortedIds = keyIds[order]
+        position = minimum(searchsorted(sortedIds, ids), len(sortedIds) - 1)
+        found = sortedIds[position] == ids
+        sources[found] = order[position[found]]
+    if not len(sources):
+        return empty((0, 2), dtype='>i8')
+    starts = ones(len(sources), dtype=bool)
+    starts[1:] = ~(((sources[1:] == sources[:-1] + 1) & (sources[:-1] >= 0)) |
+                   ((sources[1:] < 0) & (sources[:-1] < 0)))
+    starts = nonzero(starts)[0]
+    lengths = diff(concatenate((starts, [len(sources)])))
+    return column_stack((sources[starts], lengths)).astype('>i8')
+
+
+def runIndex(runs):
+    """Expands (source, length) runs into each particle's key frame index, -1 for new ones"""
+    sources = runs[:, 0].astype('i8')
+    lengths = runs[:, 1].astype('i8')
+    offsets = cumsum(lengths) - lengths
+    index = repeat(sources - offsets, lengths) + arange(lengths.sum())
+    index[repeat(sources < 0, lengths)] = -1
+    return index
+
+
+def keyedBytes(keyValues, recordType, keyCount, index):
+    """Returns a key frame record's bytes laid out in another frame's particle order
+
+    Particles the key frame doesn't have get zeros. Records with one value
+    for the whole frame are returned as they are.
+    """
+    if recordType not in (1, 3, 5):
+        return keyValues.view('u1')
+    width = dtype(pdcRecordForms[recordType]).itemsize * (3 if recordType == 5 else 1)
+    rows = keyValues.view('u1').reshape(keyCount, width)
+    keyed = zeros((len(index), width), dtype='u1')
+    kept = index >= 0
+    keyed[kept] = rows[index[kept]]
+    return keyed.ravel()
+
+
+def writeDeltaPdc(fileName, keyTicks, keyFrame, contents, level=1):
+    """Stores a PDC as its difference from a key frame in fileName.d, returns its size
+
+    keyFrame is the (particleCount, records) of the key frame, see readPdc.
+    Particles are matched to the key's by id and the matches are stored as
+    runs (see deltaRuns), then every record is stored XORed with the
+    matching key values. Values that didn't change become zeros that
+    compress to almost nothing, and the frame is rebuilt bit for bit. The
+    .d file starts with the crc32 and size of the PDC and the key frame's
+    ticks (see deltaHeader). Returns None, writing nothing, when the frame's
+    records don't match the key's.
+    """
+    keyCount, keyRecords = keyFrame
+    particleCount, records = readPdc(fileName, contents)
+    if [record[:2] for record in records] != [record[:2] for record in keyRecords]:
+        return None
+    runs = deltaRuns(particleIds(keyCount, keyRecords), particleIds(particleCount, records))
+    index = runIndex(runs)
+    compressor = compressobj(level)
+    partName = fileName + '.d.part'
+    with open(partName, 'wb') as writeFile:
+        writeFile.write(deltaHeader.pack('PDCD', crc32(contents) & 0xffffffff, len(contents),
+                                         keyTicks))
+        writeFile.write(compressor.compress(pack('>i', len(runs)) + runs.tostring()))
+        for (name, recordType, values), keyRecord in zip(records, keyRecords):
+            keyed = keyedBytes(keyRecord[2], recordType, keyCount, index)
+            writeFile.write(compressor.compress((values.view('u1') ^ keyed).tostring()))
+        writeFile.write(compressor.flush())
+        written = writeFile.tell()
+    if path.exists(fileName + '.d'):
+        remove(fileName + '.d')
+    rename(partName, fileName + '.d')
+    for stale in (fileName, fileName + '.z'):
+        if path.exists(stale):
+            remove(stale)
+    return written
+
+
+def readDeltaHeader(fileName):
+    """Returns the (crc32, size, key ticks) of the PDC held in a .d file"""
+    with open(fileName, 'rb') as readFile:
+        magic, checksum, size, keyTicks = deltaHeader.unpack(readFile.read(deltaHeader.size))
+    if magic != 'PDCD':
+        raise RuntimeError('%s is not a delta PDC file' % fileName)
+    return checksum, size, keyTicks
+
+
+def expandPdc(fileName):
+    """Rebuilds the PDC held in a .d file from its key frame and returns it, see writeDeltaPdc"""
+    expectedChecksum, expectedSize, keyTicks = readDeltaHeader(fileName)
+    with open(fileName, 'rb') as readFile:
+        readFile.seek(deltaHeader.size)
+        payload = decompressobj().decompress(readFile.read())
+    keyFile = fileName[:-len('.pdc.d')].rsplit('.', 1)[0] + '.%d.pdc' % keyTicks
+    keyCount, keyRecords = readPdc(keyFile)
+    runCount, = unpack('>i', payload[:4])
+    runs = frombuffer(payload, '>i8', runCount * 2, 4).reshape(runCount, 2)
+    index = runIndex(runs)
+    position = 4 + runs.nbytes
+    pieces = [pdcHeader.pack('PDC ', 1, 1, 0, 0, len(index), len(keyRecords))]
+    for name, recordType, keyValues in keyRecords:
+        keyed = keyedBytes(keyValues, recordType, keyCount, index)
+        changes = frombuffer(payload, 'u1', len(keyed), position)
+        position += len(keyed)
+        pieces.append(packRecordHeader(name, recordType))
+        pieces.append((keyed ^ changes).tostring())
+    contents = ''.join(pieces)
+    if (crc32(contents) & 0xffffffff, len(contents)) != (expectedChecksum, expectedSize):
+        raise RuntimeError('%s is damaged or its key frame changed, its checksum does not '
+                           'match' % fileName)
+    return contents
+
+
+def deltaKey(fileName):
+    """Returns the key frame ticks of a PDC stored only as a delta, or None"""
+    if path.exists(fileName) or path.exists(fileName + '.z') or \
+       not path.exists(fileName + '.d'):
+        return None
+    return readDeltaHeader(fileName + '.d')[2]
+
+
+def storeWhole(fileName):
+    """Keeps a frame as a compressed .z file only, rebuilding it first if it is a delta"""
+    if not path.exists(fileName):
+        if not path.exists(fileName + '.z'):
+            contents = expandPdc(fileName + '.d')
+            with open(fileName + '.part', 'wb') as writeFile:
+                writeFile.write(contents)
+            rename(fileName + '.part', fileName)
+    if path.exists(fileName):
+        archivePdc(fileName)
+    if path.exists(fileName + '.d'):
+        remove(fileName + '.d')
+
+
+def pdcPath(outputDirectory, particlesName, pdcIncrements):
+    """Returns where the PDC for one frame is written in the project"""
+    fileName = particlesName + '.' + str(pdcIncrements) + ".pdc"
+    return path.join(str(outputDirectory), 'data', fileName)
+
+
+def nCachePath(outputDirectory, particlesName, extension):
+    """Returns where the nCache .xml or .mcc of a sequence is written in the project"""
+    return path.join(str(outputDirectory), 'data', particlesName + extension)
+
+
+def pdcParticleCount(fileName):
+    """Returns the particle count in a PDC file's header without reading the rest of it"""
+    if path.exists(fileName):
+        with open(fileName, 'rb') as readFile:
+            header = readFile.read(pdcHeader.size)
+    elif path.exists(fileName + '.z'):
+        with open(fileName + '.z', 'rb') as readFile:
+            readFile.seek(archiveHeader.size)
+            header = decompressobj().decompress(readFile.read(4096), pdcHeader.size)
+    else:
+        return readPdc(fileName)[0]
+    return pdcHeader.unpack(header)[5]
+
+
+def iffChunkHeader(tag, length):
+    """Returns the tag and length that start a chunk of an nCache file"""
+    return tag + pack('>i', length)
+
+
+def nCacheFrame(outputFile, time, channels, count, records):
+    """Writes one frame's MYCH block of a one file nCache
+
+    channels is the list of (channelName, pdcName, tag) every frame holds,
+    channels missing from records are written empty.
+    """
+    values = dict((name, data) for name, _, data in records)
+    values['count'] = array([count])
+    channelData = []
+    length = 4 + 12
+    for channelName, pdcName, tag in channels:
+        data = values.get(pdcName)
+        if data is not None:
+            data = ascontiguousarray(data, dtype=nCacheChannelForms[tag])
+        channelData.append((channelName, tag, data))
+        length += 8 + (len(channelName) + 4) // 4 * 4 + 12 + 8 + (0 if data is None else data.nbytes)
+    outputFile.write(iffChunkHeader('FOR4', length) + 'MYCH' +
+                     iffChunkHeader('TIME', 4) + pack('>i', time))
+    for channelName, tag, data in channelData:
+        elements = 0 if data is None else len(data) // (3 if tag in ('DVCA', 'FVCA') else 1)
+        outputFile.write(iffChunkHeader('CHNM', len(channelName) + 1) + channelName +
+                         '\0' * ((len(channelName) + 4) // 4 * 4 - len(channelName)) +
+                         iffChunkHeader('SIZE', 4) + pack('>i', elements) +
+                         iffChunkHeader(tag, 0 if data is None else data.nbytes))
+        if data is not None:
+            data.tofile(outputFile)
+
+
+def writeNCache(outputDirectory, particlesName, frames, fps=24, precision='double',
+                manifestFile=None):
+    """Gathers a sequence's PDC files into a one file Maya nCache (.mcc and .xml)
+
+    Every frame from the first to the last converted one gets a block in
+    the .mcc file, frames without a PDC are written with no particles, so
+    Maya opens one file for the whole sequence instead of one per frame.
+    With single precision floating point channels are stored as floats,
+    except particle ids, which floats can't hold exactly past 2**24.
+    A frame's block can't be over 2GB, so the particle counts are checked
+    first and a RuntimeError is raised, before anything is written, if
+    any frame has too many. With manifestFile given the files only replace
+    the existing ones if frames holds every frame the manifest lists,
+    otherwise another run has converted more frames since and will write
+    them itself, and None is returned.
+    """
+    channelTypes = dict(nCacheChannelTypes)
+    if precision == 'single':
+        channelTypes.update(nCacheSingleChannelTypes)
+    frames = sorted(frames)
+    allFrames = range(frames[0], frames[-1] + 1)
+    first = readPdc(pdcPath(outputDirectory, particlesName, frameTicks(frames[0], fps)))[1]
+    channels = [(particlesName + '_count', 'count', 'DBLA')]
+    interpretations = ['count']
+    kinds = ['DoubleArray']
+    tags = {}
+    for name, recordType, _ in first:
+        interpretation = nCacheChannelNames.get(name, name)
+        tags[name], kind = (nCacheChannelTypes if name == 'particleId' else
+                            channelTypes)[recordType]
+        channels.append((particlesName + '_' + interpretation, name, tags[name]))
+        interpretations.append(interpretation)
+        kinds.append(kind)
+    fixedLength = 4 + 12 + 8
+    particleLength = 0
+    for channelName, pdcName, tag in channels:
+        fixedLength += 8 + (len(channelName) + 4) // 4 * 4 + 12 + 8
+    for name, recordType, _ in first:
+        length = dtype(nCacheChannelForms[tags[name]]).itemsize * \
+                 (3 if recordType in (4, 5) else 1)
+        if recordType in (1, 3, 5):
+            particleLength += length
+        else:
+            fixedLength += length
+    for frame in frames:
+        count = pdcParticleCount(pdcPath(outputDirectory, particlesName, frameTicks(frame, fps)))
+        if fixedLength + particleLength * count > 0x7fffffff:
+            raise RuntimeError('frame %d has too many points for a one file nCache, each '
+                               'frame must fit in 2GB' % frame)
+    start = frameTicks(allFrames[0], fps)
+    end = frameTicks(allFrames[-1], fps)
+    step = frameTicks(1, fps)
+    cacheFile = nCachePath(outputDirectory, particlesName, '.mcc')
+    descriptionFile = nCachePath(outputDirectory, particlesName, '.xml')
+    partNames = dict((fileName, processPartName(fileName))
+                     for fileName in (cacheFile, descriptionFile))
+    outputFile = open(partNames[cacheFile], 'wb')
+    try:
+        outputFile.write(iffChunkHeader('FOR4', 40) + 'CACV' +
+                         iffChunkHeader('VRSN', 4) + '0.1\0' +
+                         iffChunkHeader('STIM', 4) + pack('>i', start) +
+                         iffChunkHeader('ETIM', 4) + pack('>i', end))
+        converted = set(frames)
+        for frame in allFrames:
+            if frame in converted:
+                count, records = readPdc(pdcPath(outputDirectory, particlesName,
+                                                 frameTicks(frame, fps)))
+            else:
+                count, records = 0, []
+            nCacheFrame(outputFile, frameTicks(frame, fps), channels, count, records)
+    finally:
+        outputFile.close()
+    lines = ['<?xml version="1.0"?>', '<Autodesk_Cache_File>',
+             '  <cacheType Type="OneFile" Format="mcc"/>',
+             '  <time Range="%d-%d"/>' % (start, end),
+             '  <cacheTimePerFrame TimePerFrame="%d"/>' % step,
+             '  <cacheVersion Version="2.0"/>',
+             '  <extra>Converted from Houdini by PointConverter.py</extra>',
+             '  <Channels>']
+    for index, (channel, interpretation, kind) in enumerate(zip(channels, interpretations, kinds)):
+        lines.append('    <channel%d ChannelName="%s" ChannelType="%s" '
+                     'ChannelInterpretation="%s" SamplingType="Regular" SamplingRate="%d" '
+                     'StartTime="%d" EndTime="%d"/>' % (index, channel[0], kind, interpretation,
+                                                        step, start, end))
+    lines += ['  </Channels>', '</Autodesk_Cache_File>', '']
+    with open(partNames[descriptionFile], 'w') as writeFile:
+        writeFile.write('\n'.join(lines))
+    with fileLock(manifestFile or cacheFile):
+        if manifestFile is not None and \
+           set(manifestFrames(loadManifest(manifestFile), fps)) - set(frames):
+            for partName in partNames.values():
+                remove(partName)
+            return None
+        for fileName, partName in partNames.items():
+            if path.exists(fileName):
+                remove(fileName)
+            rename(partName, fileName)
+    return descriptionFile
+
+
+def attributeRecord(name, values, storage):
+    """Returns the typed PDC record for an extra point attribute, or None if it has no PDC type
+
+    Single values become double arrays, or integer arrays when Houdini
+    stored them as integers, and three component tuples become vector
+    arrays. Houdini names are mapped to Maya's per particle attribute
+    names where there is one.
+    """
+    mayaName = mayaAttributeNames.get(name, name)
+    components = values.shape[1]
+    if components == 3:
+        return mayaName, dataType['Vector Array'], values
+    if components == 1:
+        if str(storage).startswith('int'):
+            return mayaName, dataType['Integer Array'], values
+        return mayaName, dataType['Double Array'], values
+    return None
+
+
+def requestedAttributes(attributes=()):
+    """Returns the attributes a reader is asked for, P and id plus any extras by name
+
+    P keeps three components and id one, extras keep what they have.
+    """
+    wanted = {'P': 3, 'id': 1}
+    for name in attributes:
+        wanted.setdefault(name, None)
+    return wanted
+
+
+def warnMissingIds():
+    """Warns that a frame has no id attribute, so its ids follow the order of its points"""
+    warn(('No Id Values were included\n'
+          'Id values were assigned based on order of particles\n'
+          'This may cause unexpected results, to fix add a id attribute in houdini'),
+         DeprecationWarning)
+
+
+def warnSkippedAttributes(deffile, attributes, found, skipped):
+    """Warns about each extra attribute asked for that a frame lacks or can't write to a PDC"""
+    for name in attributes:
+        if name in ('P', 'id'):
+            continue
+        if name not in found:
+            warn('%s has no %s point attribute, it was skipped' % (deffile, name))
+        elif name in skipped:
+            warn('%s attribute %s can not be written to a PDC file, it was skipped' %
+                 (deffile, name))
+
+
+def readFrame(deffile, attributes=()):
+    """Parses P, id and any extra attributes of one frame into point buffers"""
+    reader = openGeoReader(deffile, requestedAttributes(attributes))
+    buffers = readPointBuffers(reader)
+    if 'P' not in reader.found:
+       raise RuntimeError('No Coords found in file, is this a .pc or .bgeo file?')
+    return reader, buffers
+
+
+def idRecord():
+    """Returns the (name, dataType, components) particle ids are written as
+
+    Ids are doubles, the type Maya's own particle caches store them as.
+    """
+    return 'particleId', dataType['Double Array'], 1
+
+
+def frameRecords(deffile, reader, buffers, attributes=()):
+    """Groups a frame's point buffers into the PDC records to write
+
+    Returns the particle count and a list of (name, dataType, buffer), in
+    the order the attributes are in the file with generated ids last, the
+    same order streamPdc writes them in.
+    """
+    particlesTotal = len(buffers['P'])
+    records = []
+    skipped = set()
+    for name, values in buffers.items():
+        if name == 'P':
+            records.append(('position', dataType['Vector Array'], values))
+            continue
+        if name == 'id':
+            records.append(idRecord()[:2] + (values,))
+            continue
+        record = attributeRecord(name, values, reader.storages.get(name))
+        if record is None or len(values) != particlesTotal:
+            skipped.add(name)
+            continue
+        records.append(record)
+    if 'id' not in buffers:
+        warnMissingIds()
+        records.append(idRecord()[:2] + (arange(particlesTotal, dtype='>f8'),))
+    warnSkippedAttributes(deffile, attributes, buffers, skipped)
+    return particlesTotal, records
+
+
+def streamRecord(name, reader):
+    """Returns the (name, dataType, components) a point attribute is streamed as, or None"""
+    if name == 'P':
+        return 'position', dataType['Vector Array'], 3
+    if name == 'id':
+        return idRecord()
+    components = keptComponents(reader.sizes[name], reader.attributes[name])
+    if components == 3:
+        return mayaAttributeNames.get(name, name), dataType['Vector Array'], 3
+    if components == 1:
+        if str(reader.storages.get(name)).startswith('int'):
+            return mayaAttributeNames.get(name, name), dataType['Integer Array'], 1
+        return mayaAttributeNames.get(name, name), dataType['Double Array'], 1
+    return None
+
+
+def streamPdc(deffile, outputFile, attributes=(), chunkSize=1024*1024):
+    """Converts one frame into a PDC file without holding the whole frame in memory
+
+    Each attribute's values go from the reader straight to a PdcStreamWriter,
+    so the working set stays at a chunk no matter how large the frame is.
+    Returns the particle count, bytes written and seconds spent writing, or
+    None when the file has no point count to lay the PDC out with.
+    """
+    reader = openGeoReader(deffile, requestedAttributes(attributes))
+    writer = None
+    current = None
+    skipped = set()
+    try:
+        for name, values in reader:
+            if writer is None:
+                if reader.pointCount is None:
+                    return None
+                writer = PdcStreamWriter(outputFile, reader.pointCount)
+            if name != current:
+                record = streamRecord(name, reader)
+                if record is None:
+                    skipped.add(name)
+                    continue
+                if not writer.startRecord(*record):
+                    skipped.add(current)
+                current = name
+            elif name in skipped:
+                continue
+            writer.writeValues(values)
+        if writer is None:
+            if reader.pointCount is None:
+                return None
+            writer = PdcStreamWriter(outputFile, reader.pointCount)
+        if not writer.finishRecord():
+            skipped.add(current)
+        if 'P' not in reader.found or 'P' in skipped:
+            raise RuntimeError('No Coords found in file, is this a .pc or .bgeo file?')
+        if 'id' not in reader.found or 'id' in skipped:
+            warnMissingIds()
+            writer.startRecord(*idRecord())
+            for start in range(0, reader.pointCount, chunkSize):
+                writer.writeValues(arange(start, min(start + chunkSize, reader.pointCount)))
+        warnSkippedAttributes(deffile, attributes, reader.found, skipped)
+        writing = writer.seconds
+        return reader.pointCount, writer.close(), writing
+    except Exception:
+        if writer is not None and not writer.outputFile.closed:
+            writer.abort()
+        raise
+
+
+def keptBefore(position, size, keep):
+    """Returns how many kept components come before the number at position in a block"""
+    return position // size * keep + min(position % size, keep)
+
+
+def splitBlock(mapped, start, end, pieceSize):
+    """Cuts a number block into (start, end, position) ranges of about pieceSize bytes
+
+    Every cut falls just after a comma. Each number but the last in a block
+    is followed by exactly one comma, so counting them gives the position
+    of every range's first number. Returns the ranges and the block's
+    number count.
+    """
+    ranges = []
+    position = 0
+    blockStart, blockEnd = start, end
+    while start < end:
+        stop = end
+        if start + pieceSize < end:
+            cut = mapped.find(',', start + pieceSize, end)
+            if cut >= 0:
+                stop = cut + 1
+        ranges.append((start, stop, position))
+        position += mapped[start:stop].count(',')
+        start = stop
+    if blockEnd - blockStart > 64 or mapped[blockStart:blockEnd].strip(' \t\r\n[],'):
+        position += 1
+    return ranges, position
+
+
+def parseRange(task):
+    """Pool entry point, parses one byte range of a number block into its place in a PDC"""
+    deffile, start, end, position, size, keep, partName, offset, form = task
+    readFile = open(deffile, 'rb')
+    mapped = mmap(readFile.fileno(), 0, access=ACCESS_READ)
+    try:
+        values = keptValues(parseNumbers(mapped[start:end]), position, size, keep)
+    finally:
+        mapped.close()
+        readFile.close()
+    outputFile = open(partName, 'r+b')
+    try:
+        outputFile.seek(offset)
+        ascontiguousarray(values, dtype=form).tofile(outputFile)
+    finally:
+        outputFile.close()
+    return len(values)
+
+
+def parseRanges(pool, tasks, workers, control=None):
+    """Runs parseRange over tasks on a pool, a few ranges ahead of the workers at a time
+
+    Only workers * 2 ranges are handed to the pool at once, so a pause
+    or cancel from control takes effect after the ranges being parsed.
+    Returns how many values were parsed, or None if the run was cancelled.
+    """
+    pending = list(reversed(tasks))
+    running = []
+    parsed = 0
+    while pending or running:
+        if control is not None and control.condition is not None and not running:
+            with control.condition:
+                while control.paused and not control.cancelled:
+                    control.condition.wait()
+        stopped = control is not None and (control.paused or control.cancelled)
+        while pending and len(running) < workers * 2 and not stopped:
+            running.append(pool.apply_async(parseRange, (pending.pop(),)))
+        if running:
+            parsed += running.pop(0).get()
+        elif control is not None and control.cancelled:
+            return None
+        elif control is not None and control.condition is None:
+            sleep(0.1)
+    return parsed
+
+
+def convertSplit(job, pool, pieceSize=None, chunkSize=1024*1024, control=None, workers=None):
+    """Converts one large ascii frame with every worker of a pool
+
+    The frame's number blocks are cut into byte ranges (see splitBlock),
+    the PDC is laid out at its full size up front and the workers parse
+    the ranges straight into their place in the file, so a single giant
+    frame uses every core. control can pause or cancel the frame between
+    ranges (see parseRanges). Returns the same (job, error, digest,
+    metrics) result as convertJob, or None if it was cancelled, leaving no
+    .part file behind.
+    """
+    deffile, particlesName, pdcIncrements, outputDirectory, attributes = \
+        str(job[0]), job[1], job[4], job[5], job[7]
+    outputFile = pdcPath(outputDirectory, particlesName, pdcIncrements)
+    partName = outputFile + '.part'
+    metrics = {'source': deffile, 'pdc': outputFile, 'worker': getpid(),
+               'bytesRead': path.getsize(deffile), 'group': 0.0, 'pack': 0.0, 'lod': 0.0,
+               'archive': 0.0}
+    started = time()
+    try:
+        reader = MappedAsciiGeoReader(deffile, requestedAttributes(attributes))
+        readFile = open(deffile, 'rb')
+        mapped = mmap(readFile.fileno(), 0, access=ACCESS_READ)
+        try:
+            blocks = OrderedDict()
+            for name, start, end, size, keep in reader.blocks(mapped):
+                blocks[name] = splitBlock(mapped, start, end, pieceSize or splitPieceSize) + \
+                    (size, keep)
+        finally:
+            mapped.close()
+            readFile.close()
+        if 'P' not in blocks:
+            raise RuntimeError('No Coords found in file, is this a .pc or .bgeo file?')
+        pointCount = reader.pointCount
+        if pointCount is None:
+            pointCount = blocks['P'][1] // blocks['P'][2]
+        records = []
+        skipped = set()
+        for name in blocks:
+            record = streamRecord(name, reader)
+            if record is not None and blocks[name][1] == pointCount * blocks[name][2]:
+                records.append(record + (name,))
+            elif name == 'P':
+                raise RuntimeError('%s has %d coordinates for %d points' %
+                                   (deffile, blocks['P'][1], pointCount))
+            else:
+                skipped.add(name)
+        if 'id' not in blocks or 'id' in skipped:
+            warnMissingIds()
+            records.append(idRecord() + (None,))
+        warnSkippedAttributes(deffile, attributes, blocks, skipped)
+        tasks = []
+        expected = 0
+        outputPDCfile = open(partName, 'wb')
+        try:
+            outputPDCfile.write(pdcHeader.pack('PDC ', 1, 1, 0, 0, pointCount, len(records)))
+            for mayaName, recordType, components, name in records:
+                outputPDCfile.write(packRecordHeader(mayaName, recordType))
+                form = pdcRecordForms[recordType]
+                offset = outputPDCfile.tell()
+                if name is None:
+                    for start in range(0, pointCount, chunkSize):
+                        arange(start, min(start + chunkSize, pointCount),
+                               dtype=form).tofile(outputPDCfile)
+                    continue
+                ranges, numbers, size, keep = blocks[name]
+                for start, end, position in ranges:
+                    tasks.append((deffile, start, end, position, size, keep, partName,
+                                  offset + keptBefore(position, size, keep) * dtype(form).itemsize,
+                                  form))
+                expected += pointCount * components
+                outputPDCfile.seek(offset + pointCount * components * dtype(form).itemsize)
+            outputPDCfile.truncate()
+            metrics['bytesWritten'] = outputPDCfile.tell()
+        finally:
+            outputPDCfile.close()
+        parsed = parseRanges(pool, tasks, workers or cpu_count(), control)
+        if parsed is None:
+            remove(partName)
+            return None
+        if parsed != expected:
+            raise RuntimeError('%s parsed %d values where %d were expected' %
+                               (deffile, parsed, expected))
+        metrics['write'] = 0.0
+        metrics['parse'] = time() - started
+        if path.exists(outputFile):
+            remove(outputFile)
+        rename(partName, outputFile)
+        metrics['total'] = time() - started
+        metrics['points'] = pointCount
+        metrics['pointsPerSecond'] = pointCount / max(metrics['total'], 1e-9)
+        metrics['workerPeakRss'] = peakMemory()
+        if job[9]:
+            archiveFrame(job, metrics)
+        return job, None, job[10] or fileDigest(deffile), metrics
+    except Exception:
+        if path.exists(partName):
+            remove(partName)
+        return job, format_exc(), None, {'source': deffile, 'worker': getpid(),
+                                         'total': time() - started, 'error': True}
+
+
+def lodName(particlesName, level):
+    """Returns the particle shape name a level of detail is written under, fooShape -> foo_lod1Shape"""
+    if particlesName.endswith('Shape'):
+        return '%s_lod%dShape' % (particlesName[:-5], level)
+    return '%s_lod%d' % (particlesName, level)
+
+
+def lodNames(particlesName, lods):
+    """Returns the shape names a cache is written under, the full cache then each level of detail"""
+    return [particlesName] + [lodName(particlesName, level) for level in range(1, len(lods) + 1)]
+
+
+def lodSelection(coords, ids, level):
+    """Returns the indices of the points kept at one level of detail
+
+    level is either a percentage of the points, like '10%', or a voxel size
+    in scene units keeping one point per voxel. Points are ranked by a hash
+    of their id so the same particles are kept from frame to frame.
+    """
+    rank = (abs(ids.ravel()).astype('u8') * 2654435761) % 4294967296
+    if str(level).endswith('%'):
+        return nonzero(rank < float(str(level)[:-1]) / 100 * 4294967296)[0]
+    cells = floor(coords / float(level)).astype('i8')
+    order = lexsort((rank, cells[:, 2], cells[:, 1], cells[:, 0]))
+    cells = cells[order]
+    first = ones(len(order), dtype=bool)
+    first[1:] = (cells[1:] != cells[:-1]).any(axis=1)
+    return sort(order[first])
+
+
+def packRecords(records):
+    """Converts each record's buffer to the contiguous big-endian form it is written in"""
+    return [(name, recordType, ascontiguousarray(values, dtype=pdcRecordForms[recordType]))
+            for name, recordType, values in records]
+
+
+def convertPcToPdc(deffile, particlesName, startframe, endframe, pdcIncrements,
+                   outputDirectory, questionasked, attributes=(), lods=()):
+    '''Converts Houdini's Point Cache file to Maya's Point Disc Cach file
+
+    attributes lists extra Houdini point attributes (Cd, v, pscale...) to
+    read in the same pass and write as typed PDC records. Frames are
+    streamed straight into the PDC (see streamPdc) unless lods asks for
+    decimated copies (see lodSelection), which need the whole frame in
+    memory. Returns a dict of metrics for the frame, see metricFields.
+    '''
+    outputFile = pdcPath(outputDirectory, particlesName, pdcIncrements)
+    metrics = {'source': str(deffile), 'pdc': outputFile, 'worker': getpid(),
+               'bytesRead': path.getsize(str(deffile)), 'group': 0.0, 'pack': 0.0,
+               'lod': 0.0, 'archive': 0.0}
+    started = time()
+    streamed = None if lods else streamPdc(deffile, outputFile, attributes)
+    if streamed is not None:
+        particlesTotal, metrics['bytesWritten'], metrics['write'] = streamed
+        metrics['total'] = time() - started
+        metrics['parse'] = metrics['total'] - metrics['write']
+        metrics['points'] = particlesTotal
+        metrics['pointsPerSecond'] = particlesTotal / max(metrics['total'], 1e-9)
+        metrics['workerPeakRss'] = peakMemory()
+        return metrics
+    reader, buffers = readFrame(deffile, attributes)
+    metrics['parse'] = time() - started
+    stage = time()
+    particlesTotal, records = frameRecords(deffile, reader, buffers, attributes)
+    metrics['group'] = time() - stage
+    stage = time()
+    records = packRecords(records)
+    metrics['pack'] = time() - stage
+    stage = time()
+    metrics['bytesWritten'] = writePdc(outputFile, particlesTotal, records)
+    metrics['write'] = time() - stage
+    stage = time()
+    columns = dict((name, values) for name, recordType, values in records)
+    for level, lod in enumerate(lods, 1):
+        keep = lodSelection(columns['position'], columns['particleId'], lod)
+        metrics['bytesWritten'] += writePdc(
+            pdcPath(outputDirectory, lodName(particlesName, level), pdcIncrements), len(keep),
+            [(name, recordType, values[keep] if recordType in (1, 3, 5) else values)
+             for name, recordType, values in records])
+    metrics['lod'] = time() - stage
+    metrics['total'] = time() - started
+    metrics['points'] = particlesTotal
+    metrics['pointsPerSecond'] = particlesTotal / max(metrics['total'], 1e-9)
+    metrics['workerPeakRss'] = peakMemory()
+    return metrics
+
+
+def peakMemory():
+    """Returns this process's peak resident memory in bytes, or None if unknown"""
+    if getrusage is not None:
+        peak = getrusage(RUSAGE_SELF).ru_maxrss
+        return peak if platform == 'darwin' else peak * 1024
+    if PsutilProcess is not None:
+        memory = PsutilProcess().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss)
+    return None
+
+
+def availableMemory():
+    """Returns the bytes of physical memory free for new work, or None if unknown"""
+    if virtual_memory is not None:
+        return virtual_memory().available
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError):
+        pass
+    if platform == 'win32':
+        class MEMORYSTATUSEX(Structure):
+            _fields_ = [('dwLength', c_ulong), ('dwMemoryLoad', c_ulong),
+                        ('ullTotalPhys', c_ulonglong), ('ullAvailPhys', c_ulonglong),
+                        ('ullTotalPageFile', c_ulonglong), ('ullAvailPageFile', c_ulonglong),
+                        ('ullTotalVirtual', c_ulonglong), ('ullAvailVirtual', c_ulonglong),
+                        ('ullAvailExtendedVirtual', c_ulonglong)]
+        status = MEMORYSTATUSEX()
+        status.dwLength = sizeof(MEMORYSTATUSEX)
+        if windll.kernel32.GlobalMemoryStatusEx(byref(status)):
+            return status.ullAvailPhys
+    return None
+
+
+def fileDigest(fileName, chunkSize=1024*1024):
+    """Returns the sha1 hex digest of a file's contents"""
+    digest = sha1()
+    with open(str(fileName), 'rb') as readFile:
+        chunk = readFile.read(chunkSize)
+        while chunk:
+            digest.update(chunk)
+            chunk = readFile.read(chunkSize)
+    return digest.hexdigest()
+
+
+def sampleDigest(fileName, blockSize=64*1024):
+    """Returns the sha1 hex digest of a file's size and its first, middle and last blocks
+
+    Cheap enough to run on every frame of a sequence, two files with
+    different sample digests can't have the same contents.
+    """
+    digest = sha1()
+    size = path.getsize(str(fileName))
+    digest.update(str(size))
+    with open(str(fileName), 'rb') as readFile:
+        for offset in (0, max(size // 2 - blockSize // 2, 0), max(size - blockSize, 0)):
+            readFile.seek(offset)
+            digest.update(readFile.read(blockSize))
+    return digest.hexdigest()
+
+
+def manifestPath(outputDirectory, particlesName):
+    """Returns the path of the conversion manifest for one cache"""
+    return path.join(str(outputDirectory), 'data', str(particlesName) + '.manifest.json')
+
+
+def loadManifest(fileName):
+    """Reads a conversion manifest, returning an empty one if it is missing or unreadable"""
+    try:
+        with open(fileName, 'r') as readFile:
+            return load(readFile)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def saveManifest(fileName, manifest):
+    """Writes a conversion manifest through a temporary file so it is never left half written"""
+    tempName = processPartName(fileName, '.tmp')
+    with open(tempName, 'w') as writeFile:
+        dump(manifest, writeFile, indent=1, sort_keys=True)
+    if path.exists(fileName):
+        remove(fileName)
+    rename(tempName, fileName)
+
+
+def processPartName(fileName, extension='.part'):
+    """Returns a temporary name for fileName no other process or farm node writes to"""
+    return '%s.%s.%d%s' % (fileName, gethostname(), getpid(), extension)
+
+
+@contextmanager
+def fileLock(fileName, timeout=300):
+    """Holds fileName.lock while a file shared by several runs is read and rewritten
+
+    Farm nodes converting chunks of one cache into the same project save
+    into the same manifest, index and nCache. The lock file is created
+    exclusively so only one of them rewrites them at a time. A lock older
+    than timeout seconds was left by a run that died and is taken over.
+    """
+    lockName = fileName + '.lock'
+    while True:
+        try:
+            handle = osopen(lockName, O_CREAT | O_EXCL | O_WRONLY)
+            break
+        except OSError as error:
+            if error.errno not in (EEXIST, EACCES):
+                raise
+        try:
+            if time() - path.getmtime(lockName) > timeout:
+                remove(lockName)
+                continue
+        except OSError:
+            continue
+        sleep(0.05)
+    try:
+        oswrite(handle, '%s %d' % (gethostname(), getpid()))
+        osclose(handle)
+        yield
+    finally:
+        remove(lockName)
+
+
+def mergeManifest(fileName, manifest, base):
+    """Saves a run's changes to a manifest, keeping the entries other runs saved meanwhile
+
+    base is the manifest as the run loaded it. Entries that differ from it
+    are written, entries dropped since are removed, and everything else is
+    taken from the file as it is now, so farm nodes converting chunks of
+    one cache don't lose each other's frames. Returns the merged manifest.
+    """
+    with fileLock(fileName):
+        merged = loadManifest(fileName)
+        for ticks in set(base) - set(manifest):
+            merged.pop(ticks, None)
+        for ticks, entry in manifest.items():
+            if base.get(ticks) != entry:
+                merged[ticks] = entry
+        saveManifest(fileName, merged)
+    return merged
+
+
+def manifestFrames(manifest, fps=24):
+    """Returns the Maya frames of every frame listed in a manifest"""
+    return [int(round(int(ticks) * fps / float(ticksPerSecond))) for ticks in manifest]
+
+
+def archivePath(outputDirectory, particlesName):
+    """Returns the path of the checksum index of one cache's archived frames"""
+    return path.join(str(outputDirectory), 'data', str(particlesName) + '.archive.json')
+
+
+def indexArchive(outputDirectory, particlesName):
+    """Writes the checksum index of a cache's archived frames, returns how many there are
+
+    The index maps each frame's ticks to the crc32 and size of its PDC and
+    the size of its .z file, read from the .z headers. A .z file left next
+    to a newer uncompressed PDC of the same frame is out of date and is
+    removed, as is a .d file (see writeDeltaPdc). A .z or .d file is
+    always written after the PDC it replaces, so one another run is still
+    archiving is kept. The index is rebuilt under a lock (see fileLock)
+    from every archived frame in data, whichever run converted it.
+    """
+    indexFile = archivePath(outputDirectory, particlesName)
+    with fileLock(indexFile):
+        index = {}
+        for storedFile in glob(pdcPath(outputDirectory, particlesName, '*') + '.[dz]'):
+            try:
+                if path.getmtime(storedFile[:-2]) > path.getmtime(storedFile):
+                    remove(storedFile)
+                    continue
+            except OSError:
+                pass
+            if storedFile.endswith('.d'):
+                continue
+            try:
+                checksum, size = readArchiveHeader(storedFile)
+                archived = path.getsize(storedFile)
+            except (IOError, OSError):
+                continue
+            ticks = storedFile[:-len('.pdc.z')].rsplit('.', 1)[1]
+            index[ticks] = {'crc32': checksum, 'size': size, 'archived': archived}
+        if index or path.exists(indexFile):
+            saveManifest(indexFile, index)
+    return len(index)
+
+
+def deltaArchive(outputDirectory, particlesName, frames, keyInterval):
+    """Stores a cache's frames as key frames and deltas, returns {ticks: key ticks} of the deltas
+
+    frames maps ticks to Maya frames. They are grouped keyInterval frames
+    at a time, the first of each group is kept whole as a .z file (see
+    archivePdc) and the others are stored as deltas from it (see
+    writeDeltaPdc), so any frame is rebuilt from two files. A group whose
+    deltas already share a key keeps it, and frames already stored against
+    it are left alone. Frames whose records differ from the key's are kept
+    whole.
+    """
+    groups = {}
+    for ticks, frame in frames.items():
+        fileName = pdcPath(outputDirectory, particlesName, ticks)
+        if [extension for extension in ('', '.z', '.d') if path.exists(fileName + extension)]:
+            groups.setdefault((frame - 1) // keyInterval, []).append(ticks)
+    deltas = {}
+    for members in groups.values():
+        members.sort()
+        usedKeys = {}
+        for ticks in members:
+            keyTicks = deltaKey(pdcPath(outputDirectory, particlesName, ticks))
+            if keyTicks is not None:
+                usedKeys[ticks] = keyTicks
+        keys = set(usedKeys.values())
+        key = members[0]
+        if len(keys) == 1 and min(keys) in members and min(keys) not in usedKeys:
+            key = min(keys)
+        keyFile = pdcPath(outputDirectory, particlesName, key)
+        storeWhole(keyFile)
+        keyFrame = readPdc(keyFile)
+        for ticks in members:
+            if ticks == key:
+                continue
+            if usedKeys.get(ticks) == key:
+                deltas[ticks] = key
+                continue
+            fileName = pdcPath(outputDirectory, particlesName, ticks)
+            if writeDeltaPdc(fileName, key, keyFrame, pdcContents(fileName)) is None:
+                storeWhole(fileName)
+            else:
+                deltas[ticks] = key
+    return deltas
+
+
+def expandCache(outputDirectory, particlesName, frames=None):
+    """Writes plain PDC files of a cache's archived and delta frames into particles
+
+    Maya and the Point Importer only read plain PDC files, this rebuilds
+    them (see pdcContents) for the frames whose ticks are in frames, or
+    all of them. Returns how many were written.
+    """
+    written = 0
+    storedFiles = set(archiveFile[:-2] for archiveFile in
+                      glob(pdcPath(outputDirectory, particlesName, '*') + '.z') +
+                      glob(pdcPath(outputDirectory, particlesName, '*') + '.d'))
+    for fileName in sorted(storedFiles):
+        ticks = fileName[:-len('.pdc')].rsplit('.', 1)[1]
+        if frames is not None and int(ticks) not in frames:
+            continue
+        targetFile = path.join(str(outputDirectory), 'particles',
+                               particlesName + '.' + ticks + '.pdc')
+        with open(targetFile + '.part', 'wb') as writeFile:
+            writeFile.write(pdcContents(fileName))
+        if path.exists(targetFile):
+            remove(targetFile)
+        rename(targetFile + '.part', targetFile)
+        written += 1
+    return written
+
+
+def sourceDuplicates(jobs):
+    """Finds jobs whose source file has the same contents as an earlier job's
+
+    Files that share their size with another are compared by a sample of
+    their contents first (see sampleDigest), so a sim whose frames all
+    have the same size isn't read whole before conversion starts. Only
+    files whose samples still match are hashed in full. Returns a list of
+    (job, original job) pairs, every other job is unique, and a dict of
+    the full digests computed, by ticks, so they aren't read again.
+    """
+    bySize = {}
+    for job in jobs:
+        bySize.setdefault(stat(str(job[0])).st_size, []).append(job)
+    bySample = {}
+    for sameSize in bySize.values():
+        for job in (sameSize if len(sameSize) > 1 else ()):
+            bySample.setdefault(sampleDigest(job[0]), []).append(job)
+    duplicates = []
+    digests = {}
+    for sameSample in bySample.values():
+        originals = {}
+        for job in (sameSample if len(sameSample) > 1 else ()):
+            digest = digests[job[4]] = fileDigest(job[0])
+            if digest in originals:
+                duplicates.append((job, originals[digest]))
+            else:
+                originals[digest] = job
+    return duplicates, digests
+
+
+def linkFile(source, target):
+    """Hard links target to source, or copies it where links aren't supported"""
+    try:
+        if link is not None:
+            link(source, target)
+            return
+        if windll is not None and windll.kernel32.CreateHardLinkW(unicode(target),
+                                                                  unicode(source), None):
+            return
+    except OSError:
+        pass
+    copyfile(source, target)
+
+
+def duplicateFrame(outputDirectory, particlesName, pdcIncrements, original):
+    """Gives a frame the same PDC as the frame at original ticks, without converting it again
+
+    The PDC (or its .z file) is hard linked where possible. Every file the
+    converter writes replaces its name rather than writing in place, so
+    linked frames never change each other.
+    """
+    source = pdcPath(outputDirectory, particlesName, original)
+    target = pdcPath(outputDirectory, particlesName, pdcIncrements)
+    for extension in ('', '.z', '.d'):
+        if path.exists(target + extension):
+            remove(target + extension)
+    for extension in ('', '.z'):
+        if path.exists(source + extension):
+            linkFile(source + extension, target + extension)
+            return
+
+
+def isUpToDate(entry, srcfile, outputFile, settings=None):
+    """Checks a manifest entry against the source file and the PDC it produced
+
+    Matching size and mtime are trusted as is. When only the mtime moved
+    the contents are hashed, so frames re-exported unchanged are not redone,
+    and the entry's mtime is refreshed. Frames converted with different
+    settings are never up to date.
+    """
+    if not entry or entry.get('source') != str(srcfile) or \
+       not [extension for extension in ('', '.z', '.d')
+            if path.exists(outputFile + extension)]:
+        return False
+    if entry.get('settings', {}) != (settings or {}):
+        return False
+    try:
+        stats = stat(str(srcfile))
+    except OSError:
+        return False
+    if stats.st_size != entry.get('size'):
+        return False
+    if stats.st_mtime == entry.get('mtime'):
+        return True
+    if fileDigest(srcfile) != entry.get('hash'):
+        return False
+    entry['mtime'] = stats.st_mtime
+    return True
+
+
+def convertJob(job):
+    """Pool entry point, converts one source file and reports any failure
+
+    The source is hashed for the manifest unless the job already carries
+    its digest, see sourceDuplicates.
+    """
+    started = time()
+    try:
+        metrics = convertPcToPdc(*job[:9])
+        if job[9]:
+            archiveFrame(job, metrics)
+        return job, None, job[10] or fileDigest(job[0]), metrics
+    except Exception:
+        return job, format_exc(), None, {'source': str(job[0]), 'worker': getpid(),
+                                         'total': time() - started, 'error': True}
+
+
+def archiveFrame(job, metrics):
+    """Compresses the PDC files a job wrote, main and levels of detail, see archivePdc"""
+    started = time()
+    metrics['bytesArchived'] = 0
+    for name in lodNames(job[1], job[8]):
+        metrics['bytesArchived'] += archivePdc(pdcPath(job[5], name, job[4]))[2]
+    metrics['archive'] = time() - started
+    metrics['total'] += metrics['archive']
+
+
+class ConversionControl(object):
+    """Lets another thread pause, resume or cancel a running ConversionPool.run
+
+    Pausing and cancelling stop new frames from being started. Frames a
+    worker has already started are finished and written, so the manifest
+    records them and nothing is left half written. A frame split across
+    every worker (see convertSplit) pauses between its ranges instead, and
+    is thrown away when cancelled.
+    """
+    def __init__(self):
+        self.paused = False
+        self.cancelled = False
+        self.condition = None
+
+    def wake(self):
+        """Wakes the run loop so it notices the change"""
+        condition = self.condition
+        if condition is not None:
+            with condition:
+                condition.notify()
+
+    def pause(self):
+        self.paused = True
+        self.wake()
+
+    def resume(self):
+        self.paused = False
+        self.wake()
+
+    def cancel(self):
+        self.cancelled = True
+        self.wake()
+
+
+class ConversionPool(object):
+    """Persistent pool of converter processes reused between conversions
+
+    Jobs are only handed to the pool while the estimated working set of
+    everything in flight fits in the free memory measured when the run
+    starts, and the caller sleeps on a condition until a job finishes
+    rather than polling the workers.
+    """
+    def __init__(self, workers=None, memoryFraction=0.75, memoryFactor=3):
+        self.workers = workers or cpu_count()
+        self.memoryFraction = memoryFraction
+        self.memoryFactor = memoryFactor
+        self.pool = Pool(self.workers)
+
+    def sourceSize(self, job):
+        """Bytes in a job's source file, 0 if it can't be read"""
+        try:
+            return path.getsize(str(job[0]))
+        except OSError:
+            return 0
+
+    def estimateMemory(self, job):
+        """Rough peak bytes a worker needs to convert one source file
+
+        Streamed and split frames keep about streamMemory no matter their
+        size. Only jobs that hold the whole frame, those writing levels of
+        detail and files with no point count in their header (see
+        streamPdc), need memoryFactor times the file's size.
+        """
+        size = self.sourceSize(job) * self.memoryFactor
+        if job[8]:
+            return size
+        try:
+            with open(str(job[0]), 'rb') as readFile:
+                if 'pointcount' not in readFile.read(4096):
+                    return size
+        except (IOError, OSError):
+            return size
+        return min(size, streamMemory)
+
+    def splittable(self, job):
+        """Whether a job is one large ascii frame worth spreading over every worker
+
+        Splitting maps the file, so frames that can't be mapped (see canMap)
+        are converted by one worker.
+        """
+        if self.workers < 2 or job[8]:
+            return False
+        try:
+            if path.getsize(str(job[0])) < splitThreshold:
+                return False
+            with open(str(job[0]), 'rb') as readFile:
+                if readFile.read(1) == '\x7f':
+                    return False
+            return canMap(job[0])
+        except (IOError, OSError):
+            return False
+
+    def run(self, jobs, progress=None, control=None):
+        """Converts every job and returns its (job, error, digest, metrics) results
+
+        The largest files are started first so a few big frames at the
+        end of a run don't leave the other workers idle. progress is called
+        with each result as it comes in, from the thread that called run.
+        A ConversionControl can pause or cancel the run from another thread,
+        jobs a cancelled run never started are left out of the results.
+        Large ascii frames are converted first, one at a time, with every
+        worker parsing part of the frame (see convertSplit).
+        """
+        memory = availableMemory()
+        budget = memory * self.memoryFraction if memory is not None else None
+        pending = sorted(jobs, key=self.sourceSize)
+        running = {}
+        results = []
+        condition = Condition()
+
+        def finished(result):
+            with condition:
+                running.pop(result[0], None)
+                results.append(result)
+                condition.notify()
+
+        reported = 0
+        if control is None:
+            control = ConversionControl()
+        control.condition = condition
+        for job in [job for job in reversed(pending) if self.splittable(job)]:
+            with condition:
+                while control.paused and not control.cancelled:
+                    condition.wait()
+            if control.cancelled:
+                break
+            pending.remove(job)
+            print("starting %s on %d workers" % (job[0], self.workers))
+            result = convertSplit(job, self.pool, control=control, workers=self.workers)
+            if result is None:
+                pending.append(job)
+                break
+            results.append(result)
+            if progress is not None:
+                progress(results[-1])
+            reported = len(results)
+        with condition:
+            while running or (pending and not control.cancelled):
+                while pending and len(running) < self.workers and \
+                      not (control.paused or control.cancelled):
+                    estimate = self.estimateMemory(pending[-1])
+                    if running and budget is not None and \
+                       sum(running.values()) + estimate > budget:
+                        break
+                    job = pending.pop()
+                    print("starting %s" % job[0])
+                    running[job] = estimate
+                    self.pool.apply_async(convertJob, (job,), callback=finished)
+                condition.wait()
+                if progress is not None:
+                    for result in results[reported:]:
+                        progress(result)
+                    reported = len(results)
+        control.condition = None
+        if pending:
+            print("cancelled, %d frames were not started" % len(pending))
+        for job, error, digest, metrics in results:
+            if error is not None:
+                print("%s failed:\n%s" % (job[0], error))
+        return results
+
+    def close(self):
+        """Shuts the worker processes down once outstanding work is done"""
+        self.pool.close()
+        self.pool.join()
+
+
+class ProgressReport(object):
+    """Adds up per frame metrics into overall progress, throughput and time left
+
+    The highest peak memory any one worker has reached is shown too, so a
+    run that is close to running out of memory can be seen coming.
+    """
+    stages = ('parse', 'group', 'pack', 'write', 'lod', 'archive')
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.points = 0
+        self.started = time()
+        self.stageTimes = dict.fromkeys(self.stages, 0.0)
+        self.workerPeaks = {}
+
+    def update(self, metrics):
+        """Counts one finished frame"""
+        self.done += 1
+        if metrics.get('error'):
+            self.failed += 1
+            return
+        self.points += metrics['points']
+        for stage in self.stages:
+            self.stageTimes[stage] += metrics[stage]
+        self.workerPeaks[metrics['worker']] = max(self.workerPeaks.get(metrics['worker'], 0),
+                                                  metrics['workerPeakRss'] or 0)
+
+    def remaining(self):
+        """Estimated seconds until every frame is done, None before the first finishes"""
+        if not self.done:
+            return None
+        return (time() - self.started) / self.done * (self.total - self.done)
+
+    def bottleneck(self):
+        """Returns the stage that has taken the most time and its share of the total"""
+        spent = sum(self.stageTimes.values())
+        stage = max(self.stages, key=self.stageTimes.get)
+        return stage, self.stageTimes[stage] / spent if spent else 0.0
+
+    def summary(self):
+        """One line describing where the conversion is up to"""
+        text = '%d/%d frames' % (self.done, self.total)
+        if self.failed:
+            text += ', %d failed' % self.failed
+        elapsed = time() - self.started
+        if self.points and elapsed:
+            text += ', %.0f points/s' % (self.points / elapsed)
+        stage, share = self.bottleneck()
+        if share:
+            text += ', %d%% %s' % (share * 100, stage)
+        if self.workerPeaks and max(self.workerPeaks.values()):
+            text += ', %dMB peak per worker' % (max(self.workerPeaks.values()) // (1024 * 1024))
+        remaining = self.remaining()
+        if remaining is not None and self.done < self.total:
+            text += ', %d:%02d:%02d left' % (remaining // 3600, remaining % 3600 // 60,
+                                             remaining % 60)
+        return text
+
+
+class MetricsLog(object):
+    """Appends per frame metrics to a JSON lines file, or CSV if the name ends in .csv"""
+    def __init__(self, fileName):
+        self.csv = str(fileName).lower().endswith('.csv')
+        newFile = not path.exists(str(fileName))
+        self.logFile = open(str(fileName), 'ab' if self.csv else 'a')
+        if self.csv:
+            self.writer = DictWriter(self.logFile, metricFields, extrasaction='ignore')
+            if newFile:
+                self.writer.writeheader()
+
+    def write(self, metrics):
+        if self.csv:
+            self.writer.writerow(metrics)
+        else:
+            self.logFile.write(dumps(metrics, sort_keys=True) + '\n')
+        self.logFile.flush()
+
+    def close(self):
+        self.logFile.close()
+
+
+def frameSummary(metrics):
+    """One line describing how a frame's conversion went"""
+    if metrics.get('error'):
+        return '%s failed after %.2fs' % (metrics['source'], metrics['total'])
+    return ('%(source)s: %(points)d points in %(total).2fs (parse %(parse).2fs, '
+            'group %(group).2fs, pack %(pack).2fs, write %(write).2fs), '
+            '%(pointsPerSecond).0f points/s' % metrics)
+
+
+def threadedFuntion(sourceFiles,startframe,endframe,particlesName,outputDirectory,questionasked,
+                    pool=None,fps=24,attributes=(),progress=None,control=None,
+                    nCache=False,lods=(),compress=False,precision='double',keyframes=0):
     """Calls the function to start multithreading"""
-    threadme(sourceFiles,startframe,endframe,particlesName,
-             outputDirectory,questionasked,threadlimit=6)
+    return threadme(sourceFiles,startframe,endframe,particlesName,
+                    outputDirectory,questionasked,pool=pool,fps=fps,attributes=attributes,
+                    progress=progress,control=control,nCache=nCache,lods=lods,
+                    compress=compress,precision=precision,keyframes=keyframes)
+
+
+def frameNumber(fileName):
+    """Returns the frame number in a source file's name, or None if it has none"""
+    match = frameNumberPattern.search(path.basename(str(fileName)))
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def sequenceFrames(sourceFiles, startframe, firstFrame=None):
+    """Pairs each source file with the Maya frame it belongs on, in frame order
+
+    Frame numbers are read from the file names, so gaps in the sequence
+    stay gaps and padding doesn't matter. The file for firstFrame (the
+    lowest frame found by default) lands on startframe. If any file has no
+    frame number the files keep the order they were given in.
+    """
+    numbers = [frameNumber(srcfile) for srcfile in sourceFiles]
+    if None in numbers:
+        return [(srcfile, startframe + count) for count, srcfile in enumerate(sourceFiles)]
+    if firstFrame is None:
+        firstFrame = min(numbers) if numbers else 0
+    frames = {}
+    for srcfile, number in zip(sourceFiles, numbers):
+        if number in frames:
+            raise RuntimeError('%s and %s are both frame %d' % (frames[number], srcfile, number))
+        frames[number] = srcfile
+    return [(frames[number], startframe + number - firstFrame) for number in sorted(frames)]
+
+
+def frameTicks(frame, fps=24):
+    """Converts a Maya frame to the tick count PDC files are named with"""
+    return int(round(frame * ticksPerSecond / float(fps)))
+
 
-    
-class Worker(Process):
-    """Class that runs multiprocessing"""
-    def __init__(self, srcfile, printlock, countfile, startframe,
-                 endframe, particlesName, outputDirectory, questionasked, **kwargs):
-        super(Worker,self).__init__(**kwargs)
-        self.srcfile = srcfile
-        self.startframe = startframe
-        self.endframe = endframe
-        self.particlesName = particlesName
-        self.outputDirectory = outputDirectory
-        self.lock = printlock
-        self.countfile = countfile
-        self.questionasked = questionasked
-
-    def run(self):
-        """Runs main function based on number of threads"""
-        with self.lock:
-            print("starting %s on %s" % (self.ident,self.srcfile))
-        pdcIncrements = 250 * (self.startframe + self.countfile)
-        convertPcToPdc(self.srcfile, self.particlesName, self.startframe,
-                        self.endframe, pdcIncrements, self.outputDirectory,
-                        self.questionasked)
-        with self.lock:
-            print("%s done" % self.ident)
-	
 def threadme(infiles,startframe,endframe,particlesName,
-             outputDirectory,questionasked,threadlimit=None,timeout=0.01):
-    """Creates number of threads and prepares them """
-    assert threadlimit > 0, "need at least one thread";
-    printlock = Lock()
-    srcfiles = list(infiles)
-    countfiles = range(len(infiles))
-    threadpool = []
-    while srcfiles or threadpool:
-        while srcfiles and \
-           (threadlimit is None \
-            or len(threadpool) < threadlimit):
-            countfile = countfiles.pop()
-            file = srcfiles.pop()
-            wrkr = Worker(file,printlock,countfile,startframe,
-                          endframe,particlesName,outputDirectory,questionasked)
-            wrkr.start()
-            threadpool.append(wrkr)
-        for thr in threadpool:
-            thr.join(timeout=timeout)
-            if not thr.is_alive():
-                threadpool.remove(thr)
+             outputDirectory,questionasked,threadlimit=None,pool=None,incremental=True,
+             fps=24,firstFrame=None,attributes=(),progress=None,metricsLog=None,
+             control=None,nCache=False,lods=(),compress=False,precision='double',
+             keyframes=0):
+    """Converts every source file on a persistent pool of worker processes
+
+    Files are placed on frames by the frame numbers in their names (see
+    sequenceFrames) and named with ticks for the given frame rate. With
+    incremental set, frames whose source and PDC are unchanged since the
+    manifest in the project's data folder was written are skipped.
+    attributes lists extra point attributes to carry into the PDC files.
+    Each frame's metrics are printed, appended to metricsLog if given, and
+    progress is called with the ProgressReport after every frame. control
+    is an optional ConversionControl used to pause or cancel the run. With
+    nCache set the PDC files are also gathered into a one file Maya nCache.
+    lods lists the levels of detail to write alongside, see lodSelection.
+    With compress set every frame is kept in the data folder as a
+    compressed .z file (see archivePdc) listed in a checksum index.
+    precision is 'double', or 'single' for float nCache
+    channels. With keyframes set the frames are kept as a whole key frame
+    every keyframes frames and deltas from it, see deltaArchive. A frame
+    is converted again whenever the key frame its delta uses is. Source
+    files with the same contents are converted once and the other frames
+    are linked to the result, see duplicateFrame.
+    """
+    assert threadlimit is None or threadlimit > 0, "need at least one thread";
+    manifestFile = manifestPath(outputDirectory, particlesName)
+    manifest = loadManifest(manifestFile) if incremental else {}
+    base = deepcopy(manifest)
+    settings = {'attributes': list(attributes)}
+    if lods:
+        settings['lods'] = list(lods)
+    jobs = []
+    frames = {}
+    candidates = []
+    for srcfile, frame in sequenceFrames(infiles, startframe, firstFrame):
+        pdcIncrements = frameTicks(frame, fps)
+        frames[pdcIncrements] = frame
+        outputFile = pdcPath(outputDirectory, particlesName, pdcIncrements)
+        if path.exists(outputFile + '.part'):
+            remove(outputFile + '.part')
+        candidates.append((srcfile, pdcIncrements, isUpToDate(
+            manifest.get(str(pdcIncrements)), srcfile, outputFile, settings)))
+    redone = set(str(ticks) for srcfile, ticks, upToDate in candidates if not upToDate)
+    for srcfile, pdcIncrements, upToDate in candidates:
+        keys = manifest.get(str(pdcIncrements), {}).get('keys', [])
+        if upToDate and not redone.intersection(keys):
+            print("skipping %s, already converted" % srcfile)
+            continue
+        jobs.append((srcfile, particlesName, startframe, endframe, pdcIncrements,
+                     outputDirectory, questionasked, tuple(attributes), tuple(lods),
+                     compress, None))
+    duplicates, digests = sourceDuplicates(jobs)
+    duplicateTicks = set(job[4] for job, original in duplicates)
+    jobs = [job[:10] + (digests.get(job[4]),) for job in jobs if job[4] not in duplicateTicks]
+    failures = []
+    if jobs:
+        report = ProgressReport(len(jobs))
+        log = MetricsLog(metricsLog) if metricsLog else None
+
+        def frameDone(result):
+            report.update(result[3])
+            if log is not None:
+                log.write(result[3])
+            print(frameSummary(result[3]))
+            print(report.summary())
+            if progress is not None:
+                progress(report)
+
+        ownPool = pool is None
+        if ownPool:
+            pool = ConversionPool(threadlimit)
+        try:
+            results = pool.run(jobs, frameDone, control)
+        finally:
+            if ownPool:
+                pool.close()
+            if log is not None:
+                log.close()
+        for job, error, digest, metrics in results:
+            if error is not None:
+                failures.append((job[0], error))
+                manifest.pop(str(job[4]), None)
+                frames.pop(job[4], None)
+                continue
+            stats = stat(str(job[0]))
+            manifest[str(job[4])] = {'source': str(job[0]), 'size': stats.st_size,
+                                     'mtime': stats.st_mtime, 'hash': digest,
+                                     'pdc': pdcPath(outputDirectory, particlesName, job[4]),
+                                     'settings': settings}
+        converted = dict((job[4], error) for job, error, digest, metrics in results)
+        for job, original in duplicates:
+            if original[4] not in converted:
+                continue
+            if converted[original[4]] is not None:
+                failures.append((job[0], converted[original[4]]))
+                manifest.pop(str(job[4]), None)
+                frames.pop(job[4], None)
+                continue
+            for name in lodNames(particlesName, lods):
+                duplicateFrame(outputDirectory, name, job[4], original[4])
+            print("%s is the same as %s, linked" % (job[0], original[0]))
+            stats = stat(str(job[0]))
+            manifest[str(job[4])] = dict(manifest[str(original[4])], source=str(job[0]),
+                                         size=stats.st_size, mtime=stats.st_mtime,
+                                         pdc=pdcPath(outputDirectory, particlesName, job[4]))
+    manifest = mergeManifest(manifestFile, manifest, base)
+    base = deepcopy(manifest)
+    if nCache and manifest and not (control is not None and control.cancelled):
+        for name in lodNames(particlesName, lods):
+            try:
+                written = writeNCache(outputDirectory, name, manifestFrames(manifest, fps), fps,
+                                      precision, manifestFile)
+            except (RuntimeError, IOError, OSError) as error:
+                print("skipped the nCache of %s, %s" % (name, error))
+                continue
+            if written is None:
+                print("left the nCache of %s to the run converting its newer frames" % name)
+            else:
+                print("wrote %s" % written)
+    if keyframes:
+        deltaKeys = {}
+        for name in lodNames(particlesName, lods):
+            for ticks, keyTicks in deltaArchive(outputDirectory, name, frames,
+                                                keyframes).items():
+                deltaKeys.setdefault(str(ticks), set()).add(str(keyTicks))
+        for ticks in frames:
+            entry = manifest.get(str(ticks))
+            if entry is not None and str(ticks) in deltaKeys:
+                entry['keys'] = sorted(deltaKeys[str(ticks)])
+            elif entry is not None:
+                entry.pop('keys', None)
+        mergeManifest(manifestFile, manifest, base)
+    for name in lodNames(particlesName, lods):
+        if compress:
+            for pdcIncrements in frames:
+                if path.exists(pdcPath(outputDirectory, name, pdcIncrements)):
+                    archivePdc(pdcPath(outputDirectory, name, pdcIncrements))
+        indexArchive(outputDirectory, name)
     print("all threads are done")                
+    return failures
+
+
+def splitAttributes(text):
+    """Splits a comma or space separated list of attribute names"""
+    return [name for name in resplit(r'[\s,]+', str(text)) if name]
+
+
+def makeProjectFolders(outputDirectory):
+    """Creates the data, particles, scenes and backup folders of a project"""
+    for folder in ('data', 'particles', 'scenes', 'backup'):
+        if not path.exists(path.join(str(outputDirectory), folder)):
+            makedirs(path.join(str(outputDirectory), folder))
+
+
+def expandSources(patterns, frames=None):
+    """Expands globs and frame patterns into a sorted list of source files
+
+    A pattern containing #### (one # per digit of padding) or Houdini's
+    $F/$F4 is filled in for every frame in frames, or globbed when no
+    frames are given. Anything else is treated as a glob.
+    """
+    sourceFiles = []
+    for pattern in patterns:
+        match = framePattern.search(pattern)
+        if match and frames is None:
+            pattern = pattern[:match.start()] + '*' + pattern[match.end():]
+        if match and frames is not None:
+            padding = len(match.group(1) or '') or int(match.group(2) or 1)
+            for frame in frames:
+                frameFile = pattern[:match.start()] + str(frame).zfill(padding) + \
+                            pattern[match.end():]
+                if path.exists(frameFile):
+                    sourceFiles.append(frameFile)
+                else:
+                    print("missing frame %s" % frameFile)
+        else:
+            sourceFiles.extend(sorted(glob(pattern)))
+    return sourceFiles
+
+
+def convertSequence(sourceFiles, name, outputDirectory, startframe=1, endframe=None,
+                    workers=None, incremental=True, pool=None, fps=24, firstFrame=None,
+                    attributes=(), metricsLog=None, nCache=False, lods=(), compress=False,
+                    precision='double', keyframes=0):
+    """Converts a list of source files without the gui, returns any failures
+
+    This is the same pipeline the Create PDC button runs, so a render farm
+    can split a sequence into chunks and convert each on its own node.
+    """
+    if endframe is None:
+        endframe = startframe + len(sourceFiles) - 1
+    makeProjectFolders(outputDirectory)
+    return threadme(sourceFiles, startframe, endframe, name + 'Shape', outputDirectory,
+                    0, threadlimit=workers, pool=pool, incremental=incremental, fps=fps,
+                    firstFrame=firstFrame, attributes=attributes, metricsLog=metricsLog,
+                    nCache=nCache, lods=lods, compress=compress, precision=precision,
+                    keyframes=keyframes)
+
+
+def main(argv):
+    """Command line entry point, returns 0 on success and 1 if any frame failed"""
+    parser = ArgumentParser(description='Convert Houdini point clouds to Maya PDC files.')
+    parser.add_argument('sources', nargs='*',
+                        help='source files, globs or frame patterns like sim.####.bgeo')
+    parser.add_argument('-n', '--name', required=True,
+                        help='name of the point cloud, Shape is appended')
+    parser.add_argument('-o', '--output', required=True, help='project directory')
+    parser.add_argument('-f', '--frames', help='frames to expand patterns with, e.g. 1-240')
+    parser.add_argument('-s', '--start', type=int,
+                        help='frame the cache starts on (first of --frames or 1)')
+    parser.add_argument('-e', '--end', type=int, help='frame the cache ends on')
+    parser.add_argument('-w', '--workers', type=int, help='worker processes (core count)')
+    parser.add_argument('--fps', type=float, default=24,
+                        help='frame rate of the Maya scene (24)')
+    parser.add_argument('-a', '--attributes', default='',
+                        help='extra point attributes to transfer, e.g. Cd,v,pscale')
+    parser.add_argument('-l', '--log', help='append per frame metrics to a .json or .csv file')
+    parser.add_argument('--force', action='store_true',
+                        help='convert every frame even if it is up to date')
+    parser.add_argument('--ncache', action='store_true',
+                        help='also gather the frames into a one file Maya nCache (.mcc/.xml), '
+                             'chunks converting into one project are gathered together')
+    parser.add_argument('--lods', default='',
+                        help='decimated copies to write as <name>_lod1, _lod2..., each a '
+                             'percentage of the points (10%%) or a voxel size (0.5)')
+    parser.add_argument('--compress', action='store_true',
+                        help='keep the frames in the data folder compressed, the importer '
+                             'restores them into particles')
+    parser.add_argument('--precision', choices=['double', 'single'], default='double',
+                        help='single stores the nCache\'s float channels as floats, '
+                             'about half the size (double)')
+    parser.add_argument('--deltas', type=int, default=0, metavar='N',
+                        help='keep one whole key frame every N frames and store the others '
+                             'as the changes from it')
+    parser.add_argument('--expand', action='store_true',
+                        help='write plain PDC files of the compressed and delta frames of '
+                             '--name into the particles folder instead of converting')
+    args = parser.parse_args(argv)
+    frames = None
+    if args.frames:
+        first, _, last = args.frames.partition('-')
+        frames = range(int(first), int(last or first) + 1)
+    startframe = args.start
+    if startframe is None:
+        startframe = frames[0] if frames else 1
+    if args.expand:
+        ticks = None
+        if frames:
+            ticks = set(frameTicks(startframe + frame - frames[0], args.fps) for frame in frames)
+        print("expanded %d frames" % expandCache(args.output, args.name + 'Shape', ticks))
+        return 0
+    sourceFiles = expandSources(args.sources, frames)
+    if not sourceFiles:
+        print("no source files found")
+        return 1
+    started = time()
+    failures = convertSequence(sourceFiles, args.name, args.output, startframe, args.end,
+                               args.workers, not args.force, fps=args.fps,
+                               firstFrame=frames[0] if frames else None,
+                               attributes=splitAttributes(args.attributes),
+                               metricsLog=args.log, nCache=args.ncache,
+                               lods=splitAttributes(args.lods), compress=args.compress,
+                               precision=args.precision, keyframes=args.deltas)
+    print("%d of %d frames converted in %.2fs" % (len(sourceFiles) - len(failures),
+                                                  len(sourceFiles), time() - started))
+    return 1 if failures else 0
+
+
+if QtCore is not None:
+    class ConversionController(QtCore.QThread):
+        """Runs a conversion on a background thread so the window stays responsive
+
+        Progress reports and the final list of failures are posted to the
+        window through signals, pause and cancel go through its control.
+        """
+        progressed = QtCore.pyqtSignal(object)
+        done = QtCore.pyqtSignal(object)
+
+        def __init__(self, arguments, keywords, parent=None):
+            QtCore.QThread.__init__(self, parent)
+            self.arguments = arguments
+            self.keywords = keywords
+            self.control = ConversionControl()
+
+        def run(self):
+            try:
+                failures = threadedFuntion(*self.arguments, progress=self.progressed.emit,
+                                           control=self.control, **self.keywords)
+            except Exception:
+                failures = [(None, format_exc())]
+            self.done.emit(failures)
 
 
 class Ui_Dialog(object):
@@ -338,16 +2829,24 @@ class Ui_Dialog(object):
     startframe = []
     endframe = []
     pdcIncrements = 250
+    fps = 24
+    attributes = []
+    nCache = False
+    lods = []
+    compress = False
+    precision = 'double'
     sourceFiles = []
     files = []
     inputString3 = ''
     outputDirectory = []
     questionasked = 0
+    conversionPool = None
+    controller = None
 
     def setupUi(self, Dialog):
         """Sets up ui window and objects"""
         Dialog.setObjectName(_fromUtf8("Dialog"))
-        Dialog.resize(376, 296)
+        Dialog.resize(376, 461)
         self.lineEdit = QtGui.QLineEdit(Dialog)
         self.lineEdit.setEnabled(False)
         self.lineEdit.setGeometry(QtCore.QRect(100, 160, 181, 20))
@@ -396,11 +2895,11 @@ class Ui_Dialog(object):
         self.label_4.setGeometry(QtCore.QRect(5, 210, 91, 20))
         self.label_4.setObjectName(_fromUtf8("label_4"))
         self.pushButton_3 = QtGui.QPushButton(Dialog)
-        self.pushButton_3.setGeometry(QtCore.QRect(200, 260, 75, 23))
+        self.pushButton_3.setGeometry(QtCore.QRect(200, 425, 75, 23))
         self.pushButton_3.setObjectName(_fromUtf8("pushButton_3"))
         self.pushButton_3.clicked.connect(self.create)
         self.pushButton_4 = QtGui.QPushButton(Dialog)
-        self.pushButton_4.setGeometry(QtCore.QRect(290, 260, 75, 23))
+        self.pushButton_4.setGeometry(QtCore.QRect(290, 425, 75, 23))
         self.pushButton_4.setObjectName(_fromUtf8("pushButton_4"))
         self.pushButton_4.clicked.connect(self.close)
         self.label_5 = QtGui.QLabel(Dialog)
@@ -424,12 +2923,76 @@ class Ui_Dialog(object):
         self.label_11 = QtGui.QLabel(Dialog)
         self.label_11.setGeometry(QtCore.QRect(70, 230, 281, 20))
         self.label_11.setObjectName(_fromUtf8("label_11"))
+        self.label_12 = QtGui.QLabel(Dialog)
+        self.label_12.setGeometry(QtCore.QRect(10, 260, 91, 20))
+        self.label_12.setObjectName(_fromUtf8("label_12"))
+        self.lineEdit_4 = QtGui.QLineEdit(Dialog)
+        self.lineEdit_4.setEnabled(True)
+        self.lineEdit_4.setGeometry(QtCore.QRect(100, 260, 181, 20))
+        self.lineEdit_4.setObjectName(_fromUtf8("lineEdit_4"))
+        self.lineEdit_4.textChanged.connect(self.getAttributes)
+        self.checkBox = QtGui.QCheckBox(Dialog)
+        self.checkBox.setGeometry(QtCore.QRect(290, 260, 81, 20))
+        self.checkBox.setObjectName(_fromUtf8("checkBox"))
+        self.checkBox.toggled.connect(self.getNCache)
+        self.label_15 = QtGui.QLabel(Dialog)
+        self.label_15.setGeometry(QtCore.QRect(10, 300, 91, 20))
+        self.label_15.setObjectName(_fromUtf8("label_15"))
+        self.lineEdit_5 = QtGui.QLineEdit(Dialog)
+        self.lineEdit_5.setEnabled(True)
+        self.lineEdit_5.setGeometry(QtCore.QRect(100, 300, 181, 20))
+        self.lineEdit_5.setObjectName(_fromUtf8("lineEdit_5"))
+        self.lineEdit_5.textChanged.connect(self.getLods)
+        self.checkBox_2 = QtGui.QCheckBox(Dialog)
+        self.checkBox_2.setGeometry(QtCore.QRect(290, 300, 81, 20))
+        self.checkBox_2.setObjectName(_fromUtf8("checkBox_2"))
+        self.checkBox_2.toggled.connect(self.getCompress)
+        self.checkBox_3 = QtGui.QCheckBox(Dialog)
+        self.checkBox_3.setGeometry(QtCore.QRect(100, 330, 181, 20))
+        self.checkBox_3.setObjectName(_fromUtf8("checkBox_3"))
+        self.checkBox_3.toggled.connect(self.getPrecision)
+        self.label_13 = QtGui.QLabel(Dialog)
+        self.label_13.setGeometry(QtCore.QRect(70, 280, 281, 20))
+        self.label_13.setObjectName(_fromUtf8("label_13"))
+        self.progressBar = QtGui.QProgressBar(Dialog)
+        self.progressBar.setGeometry(QtCore.QRect(10, 370, 355, 20))
+        self.progressBar.setObjectName(_fromUtf8("progressBar"))
+        self.progressBar.setRange(0, 100)
+        self.progressBar.setValue(0)
+        self.label_14 = QtGui.QLabel(Dialog)
+        self.label_14.setGeometry(QtCore.QRect(10, 395, 355, 20))
+        self.label_14.setObjectName(_fromUtf8("label_14"))
+        self.pushButton_5 = QtGui.QPushButton(Dialog)
+        self.pushButton_5.setGeometry(QtCore.QRect(20, 425, 75, 23))
+        self.pushButton_5.setObjectName(_fromUtf8("pushButton_5"))
+        self.pushButton_5.setEnabled(False)
+        self.pushButton_5.clicked.connect(self.pause)
+        self.pushButton_6 = QtGui.QPushButton(Dialog)
+        self.pushButton_6.setGeometry(QtCore.QRect(110, 425, 75, 23))
+        self.pushButton_6.setObjectName(_fromUtf8("pushButton_6"))
+        self.pushButton_6.setEnabled(False)
+        self.pushButton_6.clicked.connect(self.cancel)
         self.retranslateUi(Dialog)
         QtCore.QMetaObject.connectSlotsByName(Dialog)
     
     def getName(self, lineEdit_3):
         self.particlesName = self.lineEdit_3.text() + "Shape"
 
+    def getAttributes(self, lineEdit_4):
+        self.attributes = splitAttributes(self.lineEdit_4.text())
+
+    def getLods(self, lineEdit_5):
+        self.lods = splitAttributes(self.lineEdit_5.text())
+
+    def getNCache(self, checked):
+        self.nCache = bool(checked)
+
+    def getCompress(self, checked):
+        self.compress = bool(checked)
+
+    def getPrecision(self, checked):
+        self.precision = 'single' if checked else 'double'
+
     def startFrame(self, spinBox):
         self.startframe = self.spinBox.value()
         
@@ -437,30 +3000,81 @@ class Ui_Dialog(object):
         self.endframe = self.spinBox_2.value()
 
     def create(self):
-        '''Creates pdc files'''
-        writtenPDCCount = 0
-        pdcIncrements = 250
-        if not path.exists(str(self.outputDirectory) + '\\data'):
-            makedirs(str(self.outputDirectory) + '\\data')
-        if not path.exists(str(self.outputDirectory) + '\\particles'):
-            makedirs(str(self.outputDirectory) + '\\particles')
-        if not path.exists(str(self.outputDirectory) + '\\scenes'):
-            makedirs(str(self.outputDirectory) + '\\scenes')
-        if not path.exists(str(self.outputDirectory) + '\\backup'):
-            makedirs(str(self.outputDirectory) + '\\backup')
-        threadedFuntion(self.sourceFiles, self.startframe, self.endframe,
-                        self.particlesName, self.outputDirectory, self.questionasked)
+        '''Creates pdc files on a background controller'''
+        if self.controller is not None:
+            return
+        makeProjectFolders(self.outputDirectory)
+        if self.conversionPool is None:
+            self.conversionPool = ConversionPool()
+        self.controller = ConversionController(
+            (self.sourceFiles, self.startframe, self.endframe, self.particlesName,
+             self.outputDirectory, self.questionasked),
+            {'pool': self.conversionPool, 'fps': self.fps, 'attributes': self.attributes,
+             'nCache': self.nCache, 'lods': self.lods, 'compress': self.compress,
+             'precision': self.precision})
+        self.controller.progressed.connect(self.showProgress)
+        self.controller.done.connect(self.finished)
+        self.progressBar.setValue(0)
+        self.label_14.setText('Converting...')
+        self.pushButton_3.setEnabled(False)
+        self.pushButton_5.setEnabled(True)
+        self.pushButton_6.setEnabled(True)
+        self.controller.start()
+
+    def showProgress(self, report):
+        """Updates the progress bar and status line after each frame"""
+        self.progressBar.setValue(100 * report.done // max(report.total, 1))
+        self.label_14.setText(report.summary())
+
+    def finished(self, failures):
+        """Puts the window back once the controller has stopped"""
+        control = self.controller.control
+        self.controller.wait()
+        self.controller = None
+        if control.cancelled:
+            self.label_14.setText('Cancelled, converted frames were kept')
+        elif failures:
+            self.label_14.setText('%d frames failed, see the console' % len(failures))
+        else:
+            self.progressBar.setValue(100)
+            self.label_14.setText('Done')
+        self.pushButton_3.setEnabled(True)
+        self.pushButton_5.setEnabled(False)
+        self.pushButton_5.setText('Pause')
+        self.pushButton_6.setEnabled(False)
+
+    def pause(self):
+        """Stops new frames from starting, or lets them start again"""
+        control = self.controller.control
+        if control.paused:
+            control.resume()
+            self.pushButton_5.setText('Pause')
+        else:
+            control.pause()
+            self.pushButton_5.setText('Resume')
+            self.label_14.setText('Paused once the current frames finish')
+
+    def cancel(self):
+        """Stops the conversion once the frames already started are written"""
+        self.controller.control.cancel()
+        self.pushButton_5.setEnabled(False)
+        self.pushButton_6.setEnabled(False)
+        self.label_14.setText('Cancelling once the current frames finish...')
 
     def close(self):
+        if self.controller is not None:
+            self.controller.control.cancel()
+            self.controller.wait()
+        if self.conversionPool is not None:
+            self.conversionPool.close()
         sysexit(app.exec_())
     
     def browseDialog(self):
         """Browse dialog to choose pc files"""
         dialog = QtGui.QFileDialog.getOpenFileNames(caption = 'Select your .pc sequence',
-                                                    filter = 'Point Cloud Files (*.pc *.pc.classic)')
-        self.files = list(dialog)
-        self.inputString3 = ' '.join(str(n) for n in self.files)
-        self.sourceFiles = self.inputString3.split(' ')
+                                                    filter = 'Point Cloud Files (*.pc *.bgeo *.pc.classic *.bgeo.classic)')
+        self.sourceFiles = [str(name) for name in dialog]
+        self.inputString3 = ' '.join(self.sourceFiles)
         self.lineEdit.setText(self.inputString3)
     
     def browseDialog2(self):
@@ -491,6 +3105,10 @@ class Ui_Dialog(object):
                                                                None, QtGui.QApplication.UnicodeUTF8))
         self.pushButton_4.setText(QtGui.QApplication.translate("Dialog", "Close",
                                                                None, QtGui.QApplication.UnicodeUTF8))
+        self.pushButton_5.setText(QtGui.QApplication.translate("Dialog", "Pause",
+                                                               None, QtGui.QApplication.UnicodeUTF8))
+        self.pushButton_6.setText(QtGui.QApplication.translate("Dialog", "Cancel",
+                                                               None, QtGui.QApplication.UnicodeUTF8))
         self.label_5.setText(QtGui.QApplication.translate("Dialog", "Start Frame:",
                                                           None, QtGui.QApplication.UnicodeUTF8))
         self.label_6.setText(QtGui.QApplication.translate("Dialog", "Name of Point Cloud:",
@@ -505,14 +3123,35 @@ class Ui_Dialog(object):
                                                           "(Frame the cache will end on)",
                                                           None, QtGui.QApplication.UnicodeUTF8))
         self.label_10.setText(QtGui.QApplication.translate("Dialog",
-                                                           "(Navigate and select .pc or .pc.classic file sequence)",
+                                                           "(Navigate and select .pc or .bgeo file sequence)",
                                                            None, QtGui.QApplication.UnicodeUTF8))
         self.label_11.setText(QtGui.QApplication.translate("Dialog",
                                                            "(Navigate to directory to export Pdc files)",
                                                            None, QtGui.QApplication.UnicodeUTF8))
+        self.label_12.setText(QtGui.QApplication.translate("Dialog", "Extra Attributes:",
+                                                           None, QtGui.QApplication.UnicodeUTF8))
+        self.label_13.setText(QtGui.QApplication.translate("Dialog",
+                                                           "(Optional Houdini attributes, e.g. Cd, v, pscale)",
+                                                           None, QtGui.QApplication.UnicodeUTF8))
+        self.checkBox.setText(QtGui.QApplication.translate("Dialog", "nCache",
+                                                           None, QtGui.QApplication.UnicodeUTF8))
+        self.checkBox_2.setText(QtGui.QApplication.translate("Dialog", "Compress",
+                                                             None, QtGui.QApplication.UnicodeUTF8))
+        self.checkBox_3.setText(QtGui.QApplication.translate("Dialog", "Single precision",
+                                                             None, QtGui.QApplication.UnicodeUTF8))
+        self.checkBox_3.setToolTip(QtGui.QApplication.translate("Dialog",
+                                                                "Float nCache channels, about half the size",
+                                                                None, QtGui.QApplication.UnicodeUTF8))
+        self.label_15.setText(QtGui.QApplication.translate("Dialog", "Proxy LODs:",
+                                                           None, QtGui.QApplication.UnicodeUTF8))
+        self.lineEdit_5.setToolTip(QtGui.QApplication.translate("Dialog",
+                                                                "Percentages (10%) or voxel sizes (0.5), comma separated",
+                                                                None, QtGui.QApplication.UnicodeUTF8))
         
 if __name__ == "__main__":
     freeze_support()
+    if len(sysargv) > 1:
+        sysexit(main(sysargv[1:]))
     app = QtGui.QApplication(sysargv)
     window = QtGui.QDialog()
     ui = Ui_Dialog()
@@ -36,12 +36,15 @@ Read First:
  Houdini into Autodesk Maya.
 *Currently this only works with Houdini's .bgeo or .pc filetype    
  but will hopefully work with more soon.
-*If you are using Houdini 12 or newer you will need to 
- add .classic to the extension (.pc.classic or .bgeo.classic). 
- Houdini now uses binary files instead of ascii, .classic forces
- it back into ascii mode.
-*As of now it only transfers point location and id attributes, if 
- no id exists it will create ids in order of location.
+*Houdini 12 and newer save .bgeo and .pc files in a binary 
+ format, these can be selected directly. Ascii files exported 
+ with .classic on the extension (.pc.classic or .bgeo.classic)
+ still work but are larger and slower to convert.
+*Point location and id attributes are always transferred, if 
+ no id exists it will create ids in order of location. Other 
+ point attributes (Cd, v, pscale, age, N...) can be listed under
+ Extra Attributes and are written with Maya's per particle names
+ (rgbPP, velocity, radiusPP, age, normalPP...).
 *For the second tool to work you must have Autodesk Maya installed, 
   either versions 2012 or 2013. Other versions are untested.
 
@@ -59,6 +62,9 @@ Important Notes:
  sequence.
 *For example, if you import frames 30-50 into Maya, 1-29 will    
  automatically be empty cache files.
+*Source files are placed on frames by the frame number in their 
+ file names, so a frame missing from the sequence stays empty 
+ instead of shifting the frames after it.
 *A series of folders will be created in the directory you choose 
  if they don't already exist.
 *Those folders are called scenes, particles, data and backup.
@@ -68,6 +74,9 @@ Important Notes:
  folder are for backups of the cache and scene.
 *If you modify the cache in the particles folder, you can replace the
  cache with the original in the data folder.
+*The Point Converter keeps a <name>Shape.manifest.json file in the
+ data folder and skips frames whose source file hasn't changed
+ since they were converted. Delete it to convert everything again.
 *It will set the current scenes project folder to whichever 
  folder you choose as the directory.
 *Changing the name of the scene will normally break the cache, so 
@@ -106,18 +115,417 @@ except:
 import maya.cmds as cmds
 import maya.mel as mel
 from time import time as tTime
-from glob import iglob
+from ctypes import CDLL
+from ctypes.util import find_library
+from glob import glob
+from json import load
+from math import ceil
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from optparse import OptionParser
 from shutil import copy
+from struct import Struct
+from os import remove
+from os import rename
+from os.path import basename
+from os.path import exists
+from os.path import getsize
 from os.path import join
-from PyQt4 import QtCore
-from PyQt4 import QtGui
+from zlib import crc32
+from zlib import decompressobj
 from sys import argv as sysargv
 from sys import exit as sysexit
+from sys import platform
 
+try:
+    from PyQt4 import QtCore
+    from PyQt4 import QtGui
+except ImportError:
+    QtCore = None
+    QtGui = None
 try:
     _fromUtf8 = QtCore.QString.fromUtf8
 except AttributeError:
     _fromUtf8 = lambda s: s
+try:
+    from os import link
+except ImportError:
+    link = None
+try:
+    from os.path import samefile
+except ImportError:
+    samefile = None
+try:
+    from fcntl import ioctl
+except ImportError:
+    ioctl = None
+try:
+    from ctypes import windll
+except ImportError:
+    windll = None
+
+archiveHeader = Struct('>4sIQ')
+emptyPdc = Struct('>4sii2iii').pack('PDC ', 1, 1, 0, 0, 0, 0)
+cloneRequest = 0x40049409
+
+
+def fileChecksum(fileName, chunkSize=1024*1024):
+    '''Returns the crc32 of a file's contents'''
+    checksum = 0
+    with open(fileName, 'rb') as readFile:
+        chunk = readFile.read(chunkSize)
+        while chunk:
+            checksum = crc32(chunk, checksum)
+            chunk = readFile.read(chunkSize)
+    return checksum & 0xffffffff
+
+
+def readArchiveHeader(fileName):
+    '''Returns the (crc32, size) of the PDC held in a compressed .z file'''
+    with open(fileName, 'rb') as readFile:
+        magic, checksum, size = archiveHeader.unpack(readFile.read(archiveHeader.size))
+    if magic != 'PDCZ':
+        raise RuntimeError('%s is not a compressed PDC file' % fileName)
+    return checksum, size
+
+
+def restorePdc(fileName, outputFile, chunkSize=1024*1024):
+    '''Decompresses a .z file written by the Point Converter into outputFile
+
+    The PDC is written under a .part name and only renamed into place once
+    its crc32 matches the one recorded when it was compressed.
+    '''
+    expected = readArchiveHeader(fileName)
+    decompressor = decompressobj()
+    checksum = 0
+    with open(fileName, 'rb') as readFile:
+        with open(outputFile + '.part', 'wb') as writeFile:
+            readFile.seek(archiveHeader.size)
+            chunk = readFile.read(chunkSize)
+            while chunk:
+                piece = decompressor.decompress(chunk)
+                checksum = crc32(piece, checksum)
+                writeFile.write(piece)
+                chunk = readFile.read(chunkSize)
+            piece = decompressor.flush()
+            checksum = crc32(piece, checksum)
+            writeFile.write(piece)
+            size = writeFile.tell()
+    if (checksum & 0xffffffff, size) != expected:
+        remove(outputFile + '.part')
+        raise RuntimeError('%s is damaged, its checksum does not match' % fileName)
+    if exists(outputFile):
+        remove(outputFile)
+    rename(outputFile + '.part', outputFile)
+
+
+def reflink(source, target):
+    '''Clones source to target sharing its blocks until either is changed
+
+    Works on Linux filesystems that support FICLONE (btrfs, xfs) and on
+    APFS, returns False anywhere else so the caller can fall back.
+    '''
+    if platform.startswith('linux') and ioctl is not None:
+        with open(source, 'rb') as readFile:
+            with open(target, 'wb') as writeFile:
+                try:
+                    ioctl(writeFile.fileno(), cloneRequest, readFile.fileno())
+                    return True
+                except IOError:
+                    pass
+        remove(target)
+    elif platform == 'darwin':
+        clonefile = getattr(CDLL(find_library('c')), 'clonefile', None)
+        return clonefile is not None and clonefile(source, target, 0) == 0
+    return False
+
+
+def hardLink(source, target):
+    '''Links target to the same file as source, returns False where that isn't possible'''
+    try:
+        if link is not None:
+            link(source, target)
+            return True
+        if windll is not None:
+            return bool(windll.kernel32.CreateHardLinkW(unicode(target), unicode(source), None))
+    except OSError:
+        pass
+    return False
+
+
+def publishFrame(source, target, hardLinks=False):
+    '''Puts a PDC from the data folder in place in particles, without copying it if possible
+
+    A reflink is tried first, then a hard link if hardLinks is set, and
+    the file is copied if neither works. A hard linked frame shares its
+    contents with the one in data, so editing it in place edits both.
+    '''
+    if exists(target):
+        remove(target)
+    if reflink(source, target) or (hardLinks and hardLink(source, target)):
+        return
+    copy(source, target)
+
+
+def syncFrame(task):
+    '''Brings one frame in particles up to date, returns False if it already was'''
+    fileName, archived, checksum, size, target, hardLinks = task
+    if exists(target) and getsize(target) == size:
+        if not archived and samefile is not None and samefile(fileName, target):
+            return False
+        if checksum is None:
+            checksum = fileChecksum(fileName)
+        if fileChecksum(target) == checksum:
+            return False
+    if archived:
+        restorePdc(fileName, target)
+    else:
+        publishFrame(fileName, target, hardLinks)
+    return True
+
+
+def syncCache(dataDirectory, cacheDirectory, cacheName, lastTicks=None, hardLinks=False,
+              workers=None):
+    '''Brings a cache's PDC frames in particles up to date with the data folder
+
+    Frames kept compressed (.pdc.z) are decompressed and plain PDC files
+    are published with publishFrame, several frames at a time. Frames
+    after lastTicks are not needed and are left alone, and a frame whose
+    copy in particles already has the same size and crc32 is skipped. The
+    checksums of compressed frames come from the cache's .archive.json
+    index, or the .z file itself if the index is out of date. Frames
+    stored as deltas are left alone, see deltaFrames. Returns how many
+    frames were written and skipped.
+    '''
+    index = {}
+    indexFile = join(dataDirectory, cacheName + '.archive.json')
+    if exists(indexFile):
+        with open(indexFile, 'r') as readFile:
+            index = load(readFile)
+    tasks = []
+    for fileName in sorted(glob(join(dataDirectory, cacheName + '.*.pdc')) +
+                           glob(join(dataDirectory, cacheName + '.*.pdc.z'))):
+        archived = fileName.endswith('.z')
+        pdcName = fileName[:-2] if archived else fileName
+        if archived and exists(pdcName):
+            continue
+        ticks = pdcName[:-4].rsplit('.', 1)[1]
+        if lastTicks is not None and int(ticks) > lastTicks:
+            continue
+        if archived:
+            entry = index.get(ticks)
+            if entry and entry.get('archived') == getsize(fileName):
+                checksum, size = entry['crc32'], entry['size']
+            else:
+                checksum, size = readArchiveHeader(fileName)
+        else:
+            checksum, size = None, getsize(fileName)
+        target = join(cacheDirectory, cacheName + '.' + ticks + '.pdc')
+        tasks.append((fileName, archived, checksum, size, target, hardLinks))
+    pool = ThreadPool(workers or cpu_count())
+    try:
+        written = sum(pool.map(syncFrame, tasks))
+    finally:
+        pool.close()
+        pool.join()
+    return written, len(tasks) - written
+
+
+def deltaFrames(dataDirectory, cacheName, lastTicks=None):
+    '''Returns the ticks of the frames up to lastTicks kept in data only as deltas (.pdc.d)
+
+    Rebuilding a delta needs NumPy, which Maya's Python doesn't have, so
+    these frames have to be written into particles by the Point
+    Converter's --expand before the cache is imported.
+    '''
+    ticksList = []
+    for fileName in glob(join(dataDirectory, cacheName + '.*.pdc.d')):
+        ticks = fileName[:-len('.pdc.d')].rsplit('.', 1)[1]
+        if exists(fileName[:-2]) or exists(fileName[:-2] + '.z') or \
+           (lastTicks is not None and int(ticks) > lastTicks):
+            continue
+        ticksList.append(int(ticks))
+    return sorted(ticksList)
+
+
+def cacheEntries(specs, fps=24):
+    '''Turns name:endFrame pairs and converter manifests into (cache name, end frame) entries
+
+    A manifest (<name>Shape.manifest.json in the data folder) imports its
+    cache up to the last frame that was converted.
+    '''
+    entries = []
+    for spec in specs:
+        if spec.endswith('.manifest.json'):
+            with open(spec, 'r') as readFile:
+                manifest = load(readFile)
+            if not manifest:
+                print('%s has no converted frames, it was skipped' % spec)
+                continue
+            lastTicks = max(int(ticks) for ticks in manifest)
+            entries.append((basename(spec)[:-len('Shape.manifest.json')],
+                            int(ceil(lastTicks * fps / 6000.0))))
+        else:
+            cacheName, _, endFrame = spec.rpartition(':')
+            entries.append((cacheName, int(endFrame)))
+    return entries
+
+
+def cachedFrames(cacheDirectory, cacheName, endFrame, fps=24):
+    '''Returns the frames up to endFrame that have a PDC in particles, in order'''
+    frames = set()
+    for fileName in glob(join(cacheDirectory, cacheName + '.*.pdc')):
+        ticks = fileName[:-4].rsplit('.', 1)[1]
+        if ticks.isdigit() and int(round(int(ticks) * fps / 6000.0)) <= int(endFrame):
+            frames.add(int(round(int(ticks) * fps / 6000.0)))
+    return sorted(frames)
+
+
+def padFrames(cacheDirectory, cacheName, frames, fps=24):
+    '''Writes an empty PDC for the frames missing between the first and last of frames
+
+    Frames outside that range are left to the disk cache's frame range
+    (see bindDiskCache), so nothing is written for a cache that starts
+    late. Returns how many frames were padded.
+    '''
+    padded = 0
+    for frame in range(frames[0], frames[-1] + 1) if frames else ():
+        ticks = int(round(frame * 6000.0 / fps))
+        target = join(cacheDirectory, cacheName + '.' + str(ticks) + '.pdc')
+        if not exists(target):
+            with open(target, 'wb') as writeFile:
+                writeFile.write(emptyPdc)
+            padded += 1
+    return padded
+
+
+def bindDiskCache(firstFrame, lastFrame):
+    '''Turns on the particle disk cache and points it at frames firstFrame to lastFrame
+
+    If the disk cache is already on, for another cache in the scene, its
+    range is widened to cover both.
+    '''
+    activeGlobals = cmds.dynGlobals(query=True, active=True)
+    if cmds.getAttr(activeGlobals + '.useParticleDiskCache'):
+        firstFrame = min(firstFrame, cmds.getAttr(activeGlobals + '.minFrameCached'))
+        lastFrame = max(lastFrame, cmds.getAttr(activeGlobals + '.maxFrameCached'))
+    cmds.setAttr(activeGlobals + '.useParticleDiskCache', 1)
+    cmds.setAttr(activeGlobals + '.minFrameCached', int(firstFrame))
+    cmds.setAttr(activeGlobals + '.maxFrameCached', int(lastFrame))
+
+
+def importCache(projectDirectory, cacheName, endFrame, hardLinks=False, bind=False):
+    '''Creates the particle node of one cache and brings its frames into particles
+
+    The project must already be set. By default dynExport writes an empty
+    PDC for every frame before the converted frames replace them. With
+    bind set the converted frames are published as they are, only gaps
+    between them are padded (see padFrames) and the disk cache is switched
+    on directly for the converted frames' range. Returns how many frames
+    were written and how many were already up to date.
+
+    A cache with frames stored as deltas (see deltaFrames) can only be
+    bound, once --expand has written those frames into particles,
+    anything else raises a RuntimeError before the scene is touched.
+    '''
+    cacheDirectory = projectDirectory + '/particles/'
+    fps = mel.eval('currentTimeUnitToFPS')
+    lastTicks = int(round(float(endFrame) * 6000 / fps))
+    deltas = deltaFrames(projectDirectory + '/data/', cacheName + 'Shape', lastTicks)
+    if deltas and not bind:
+        raise RuntimeError('%d frames of %s are stored as deltas, run the Point Converter '
+                           'with --expand and import with Bind existing frames' %
+                           (len(deltas), cacheName))
+    missing = [ticks for ticks in deltas if not
+               exists(join(cacheDirectory, cacheName + 'Shape.' + str(ticks) + '.pdc'))]
+    if missing:
+        raise RuntimeError('%d frames of %s are stored as deltas and have not been expanded, '
+                           'run the Point Converter with --expand first' %
+                           (len(missing), cacheName))
+    mel.eval('particle -name "' + cacheName + '";')
+    if bind:
+        synced = syncCache(projectDirectory + '/data/', cacheDirectory, cacheName + 'Shape',
+                           lastTicks, hardLinks)
+        frames = cachedFrames(cacheDirectory, cacheName + 'Shape', endFrame, fps)
+        if frames:
+            padFrames(cacheDirectory, cacheName + 'Shape', frames, fps)
+            bindDiskCache(frames[0], frames[-1])
+        else:
+            print('%s has no frames up to frame %s' % (cacheName, endFrame))
+        return synced
+    for fname in glob(cacheDirectory + cacheName + 'Shape.*.pdc'):
+        # dynExport rewrites these in place, which would go through a hard link into data
+        remove(fname)
+    mel.eval('dynExport -f "cache" -mnf 1 -mxf ' + str(endFrame) +' -oup 0 ' + cacheName + ';')
+    return syncCache(projectDirectory + '/data/', cacheDirectory, cacheName + 'Shape',
+                     lastTicks, hardLinks)
+
+
+def importCaches(projectDirectory, sceneName, caches, sourceFile=None, hardLinks=False,
+                 bind=False):
+    '''Imports many caches into one scene, which is saved once at the end
+
+    caches is a list of (cache name, end frame). The scene in sourceFile is
+    opened first if given, otherwise the caches go into the current scene.
+    A cache that can't be imported (see importCache) is reported and left
+    out. Returns the names of those caches.
+    '''
+    if sourceFile:
+        cmds.file(sourceFile, o=True, force=True)
+    lastFrame = max(endFrame for _, endFrame in caches)
+    if cmds.playbackOptions(query=True, maxTime=True) < lastFrame:
+        cmds.playbackOptions(minTime='1', maxTime=lastFrame)
+    projectDirectory = str(projectDirectory).replace("\\", "/")
+    cmds.file(rename=projectDirectory + "/scenes/" + sceneName + ".mb")
+    mel.eval('setProject "' + projectDirectory + '";')
+    failed = []
+    for cacheName, endFrame in caches:
+        try:
+            written, skipped = importCache(projectDirectory, cacheName, endFrame, hardLinks,
+                                           bind)
+        except RuntimeError as error:
+            print('%s was not imported, %s' % (cacheName, error))
+            failed.append(cacheName)
+            continue
+        print('%s: %d frames restored, %d already up to date' % (cacheName, written, skipped))
+    cmds.currentTime(1)
+    cmds.file(save=1, type='mayaBinary')
+    return failed
+
+
+def main(argv):
+    '''Headless batch import, brings every cache into one scene with a single Maya start up
+
+    Uses optparse, Maya 2012 and 2013 ship Python 2.6 which has no argparse.
+    '''
+    parser = OptionParser(usage='%prog -p PROJECT -s SCENE cache [cache ...]',
+                          description='Import converted point caches into one Maya scene. '
+                                      'Each cache is a name:endFrame pair, or a '
+                                      '<name>Shape.manifest.json file from the data folder '
+                                      'to import every converted frame.')
+    parser.add_option('-p', '--project', help='project directory')
+    parser.add_option('-s', '--scene', help='name of the scene saved in the scenes folder')
+    parser.add_option('-i', '--input', help='existing scene to bring the caches into')
+    parser.add_option('--fps', type='float', default=24,
+                      help='frame rate the manifests were converted at (24)')
+    parser.add_option('--hard-links', action='store_true', default=False,
+                      help='link frames from data instead of copying them')
+    parser.add_option('--bind', action='store_true', default=False,
+                      help='bind the converted frames directly instead of running dynExport')
+    args, specs = parser.parse_args(argv)
+    if not args.project or not args.scene:
+        parser.error('-p/--project and -s/--scene are required')
+    if not specs:
+        parser.error('no caches given')
+    caches = cacheEntries(specs, args.fps)
+    if not caches:
+        print('no caches to import')
+        return 1
+    started = tTime()
+    failed = importCaches(args.project, args.scene, caches, args.input, args.hard_links,
+                          args.bind)
+    print('%d caches imported in %.2fs' % (len(caches) - len(failed), tTime() - started))
+    return 1 if failed else 0
 
 
 class Ui_PointImporter(object):
@@ -127,6 +535,8 @@ class Ui_PointImporter(object):
     sourceFile = []
     sceneName = ''
     projectDirectory = []
+    hardLinks = False
+    bind = False
     def setupUi(self, PointImporter):
         PointImporter.setObjectName(_fromUtf8("PointImporter"))
         PointImporter.resize(376, 419)
@@ -203,6 +613,14 @@ class Ui_PointImporter(object):
         self.pushButton_4.setGeometry(QtCore.QRect(290, 350, 75, 23))
         self.pushButton_4.setObjectName(_fromUtf8("pushButton_4"))
         self.pushButton_4.clicked.connect(self.close)
+        self.checkBox = QtGui.QCheckBox(self.centralwidget)
+        self.checkBox.setGeometry(QtCore.QRect(10, 350, 181, 20))
+        self.checkBox.setObjectName(_fromUtf8("checkBox"))
+        self.checkBox.toggled.connect(self.getHardLinks)
+        self.checkBox_2 = QtGui.QCheckBox(self.centralwidget)
+        self.checkBox_2.setGeometry(QtCore.QRect(10, 375, 181, 20))
+        self.checkBox_2.setObjectName(_fromUtf8("checkBox_2"))
+        self.checkBox_2.toggled.connect(self.getBind)
         self.label_8 = QtGui.QLabel(self.centralwidget)
         self.label_8.setGeometry(QtCore.QRect(70, 260, 231, 20))
         self.label_8.setObjectName(_fromUtf8("label_8"))
@@ -251,6 +669,10 @@ class Ui_PointImporter(object):
         self.label_10.setText(QtGui.QApplication.translate("PointImporter", "(Last frame of cache)", None, QtGui.QApplication.UnicodeUTF8))
         self.label_11.setText(QtGui.QApplication.translate("PointImporter", "(Name of new save file)", None, QtGui.QApplication.UnicodeUTF8))
         self.label_12.setText(QtGui.QApplication.translate("PointImporter", "(Same directory as before)", None, QtGui.QApplication.UnicodeUTF8))
+        self.checkBox.setText(QtGui.QApplication.translate("PointImporter", "Hard link frames", None, QtGui.QApplication.UnicodeUTF8))
+        self.checkBox.setToolTip(QtGui.QApplication.translate("PointImporter", "Link frames from data instead of copying them, editing one edits both", None, QtGui.QApplication.UnicodeUTF8))
+        self.checkBox_2.setText(QtGui.QApplication.translate("PointImporter", "Bind existing frames", None, QtGui.QApplication.UnicodeUTF8))
+        self.checkBox_2.setToolTip(QtGui.QApplication.translate("PointImporter", "Use the converted frames as they are instead of exporting an empty cache first", None, QtGui.QApplication.UnicodeUTF8))
 
     def create(self):
         '''Create Maya scene file'''
@@ -265,15 +687,14 @@ class Ui_PointImporter(object):
         cmds.file(save=1)
         stringDirectory = str(self.projectDirectory)
         outputDirectoryTemp = stringDirectory.replace("\\","/");
-        cacheDirectory = outputDirectoryTemp + '/particles/'
-        startFrame = 1
         mel.eval('setProject "' + outputDirectoryTemp + '";')
-        mel.eval('particle -name "' + str(self.cacheName) + '";')
-        mel.eval('dynExport -f "cache" -mnf 1 -mxf ' + str(self.endFrame) +' -oup 0 ' + str(self.cacheName) + ';')
-        newCacheName = str(self.cacheName) + 'Shape'
-        cacheFile1 = outputDirectoryTemp + '/data/' + newCacheName + '.*'        
-        for fname in iglob(cacheFile1):
-            copy(fname, join(cacheDirectory))
+        try:
+            written, skipped = importCache(outputDirectoryTemp, str(self.cacheName),
+                                           self.endFrame, self.hardLinks, self.bind)
+        except RuntimeError as error:
+            QtGui.QMessageBox.warning(None, 'Point Importer', str(error))
+            return
+        print('%d frames restored, %d already up to date' % (written, skipped))
         cmds.currentTime(1)
         cmds.file(rename = str(self.projectDirectory + "\\scenes\\" + self.sceneName + ".mb"))
         cmds.file(save=1)
@@ -303,8 +724,16 @@ class Ui_PointImporter(object):
     def getName2(self, lineEdit_4):
         self.cacheName = self.lineEdit_4.text()
 
+    def getHardLinks(self, checked):
+        self.hardLinks = bool(checked)
+
+    def getBind(self, checked):
+        self.bind = bool(checked)
+
 
 if __name__ == "__main__":
+    if len(sysargv) > 1:
+        sysexit(main(sysargv[1:]))
     app = QtGui.QApplication(sysargv)
     PointImporter = QtGui.QMainWindow()
     ui = Ui_PointImporter()